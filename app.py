@@ -1,31 +1,69 @@
 import os
 import json
 import tempfile
-import shutil
 import re
-from flask import Flask, request, jsonify, send_file, make_response
+from flask import Flask, request, send_file, make_response, Response
 from flask_cors import CORS
+from flask_compress import Compress
 from werkzeug.utils import secure_filename
-from azure.ai.formrecognizer import DocumentAnalysisClient
+from azure.ai.formrecognizer import DocumentAnalysisClient, AnalyzeResult
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+from azure.core.pipeline.transport import RequestsTransport
 import openai
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+import tiktoken
+import numpy as np
+import orjson
 from dotenv import load_dotenv
 import uuid
+from urllib.parse import quote
 import fitz  # PyMuPDF
 from PIL import Image
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.utils import ImageReader
 import io
 import base64
+import hashlib
+import time
+import threading
+import logging
+import atexit
+import zipfile
+import unicodedata
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict, List, Tuple, Optional
 
 # Load environment variables
 load_dotenv()
 
+# Per-item diagnostics are logged at DEBUG; set LOG_LEVEL=DEBUG to see them
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 CORS(app, expose_headers=['Content-Disposition'])  # Enable CORS and expose Content-Disposition header
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.json.compact = True  # never pretty-print JSON Flask itself generates, even in debug mode
+
+# Compress JSON responses (OCR output is mostly repeated keys and numbers), preferring
+# brotli when the client accepts it. PDFs are not in the default mimetypes, and small
+# error bodies are left alone since compressing them costs more than it saves
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 4096
+Compress(app)
+
+# When running behind a web server that supports X-Sendfile (Apache mod_xsendfile,
+# lighttpd), let it stream returned PDFs from disk instead of the Python worker
+app.use_x_sendfile = os.getenv('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+
+# Behind nginx, set this to an internal location that aliases UPLOAD_FOLDER
+# (e.g. /protected-uploads/) so renamed PDFs are served via X-Accel-Redirect
+X_ACCEL_REDIRECT_PREFIX = os.getenv('X_ACCEL_REDIRECT_PREFIX', '')
 
 # Configure Azure Form Recognizer
 AZURE_ENDPOINT = os.getenv('AZURE_ENDPOINT')
@@ -34,83 +72,320 @@ AZURE_KEY = os.getenv('AZURE_KEY')
 # Configure OpenAI
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
+# Optional secondary endpoints, used when the primary still fails with a rate
+# limit, timeout or server error after the SDK's own retries are exhausted
+AZURE_SECONDARY_ENDPOINT = os.getenv('AZURE_SECONDARY_ENDPOINT')
+AZURE_SECONDARY_KEY = os.getenv('AZURE_SECONDARY_KEY')
+OPENAI_SECONDARY_BASE_URL = os.getenv('OPENAI_SECONDARY_BASE_URL')
+OPENAI_SECONDARY_API_KEY = os.getenv('OPENAI_SECONDARY_API_KEY')
+
+# Retry settings for transient errors (429, 5xx, timeouts); both SDKs back off exponentially
+AZURE_MAX_RETRIES = 3
+OPENAI_MAX_RETRIES = 3
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Concurrency limits for Azure analyses: the semaphore caps in-flight requests
+# per process (keep it under the resource's TPS quota to avoid 429s), and long
+# PDFs are split into chunks of OCR_PAGES_PER_REQUEST pages analyzed in parallel
+AZURE_MAX_CONCURRENCY = int(os.getenv('AZURE_MAX_CONCURRENCY', '8'))
+OCR_PAGES_PER_REQUEST = 8
+azure_semaphore = threading.BoundedSemaphore(AZURE_MAX_CONCURRENCY)
+ocr_executor = ThreadPoolExecutor(max_workers=AZURE_MAX_CONCURRENCY)
+
+# Shared HTTP connection pools, so concurrent requests reuse warm keep-alive
+# connections instead of paying a TLS handshake per Azure/OpenAI call
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '32'))
+# Keep idle connections for 75s (httpx drops them after 5s by default), so requests
+# a few seconds apart still find a warm connection
+HTTP_KEEPALIVE_EXPIRY = 75
+
+azure_http_session = requests.Session()
+# Both Azure clients and their status polls share this session. Size it to at least
+# the analysis concurrency, otherwise urllib3 discards the surplus connections
+# after each call and the next burst pays the TLS handshake again
+azure_http_session.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=max(HTTP_POOL_SIZE, AZURE_MAX_CONCURRENCY)
+))
+azure_transport = RequestsTransport(
+    session=azure_http_session,
+    session_owner=False,
+    connection_timeout=10,
+    read_timeout=60
+)
+
+openai_http_client = httpx.Client(
+    timeout=openai.DEFAULT_TIMEOUT,
+    limits=httpx.Limits(
+        max_connections=HTTP_POOL_SIZE * 2,
+        max_keepalive_connections=HTTP_POOL_SIZE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+)
+
+# Close pooled connections cleanly when the worker process exits
+atexit.register(azure_http_session.close)
+atexit.register(openai_http_client.close)
+
 # Initialize clients
 document_analysis_client = DocumentAnalysisClient(
     endpoint=AZURE_ENDPOINT, 
-    credential=AzureKeyCredential(AZURE_KEY)
+    credential=AzureKeyCredential(AZURE_KEY),
+    transport=azure_transport,
+    retry_total=AZURE_MAX_RETRIES,
+    retry_backoff_factor=1,
+    retry_backoff_max=10
 )
 
+secondary_document_analysis_client = None
+if AZURE_SECONDARY_ENDPOINT and AZURE_SECONDARY_KEY:
+    secondary_document_analysis_client = DocumentAnalysisClient(
+        endpoint=AZURE_SECONDARY_ENDPOINT,
+        credential=AzureKeyCredential(AZURE_SECONDARY_KEY),
+        transport=azure_transport,
+        retry_total=AZURE_MAX_RETRIES,
+        retry_backoff_factor=1,
+        retry_backoff_max=10
+    )
+
+# Renaming only needs line text, so it uses the cheaper and faster OCR-only model;
+# redaction keeps prebuilt-document for its key-value pairs
+TEXT_MODEL_ID = "prebuilt-read"
+ANALYSIS_MODEL_ID = "prebuilt-document"
+
+# Seconds between Azure analysis status polls. Short documents finish in a couple of
+# seconds, so a tight interval returns them sooner at the cost of a few cheap GETs
+AZURE_POLLING_INTERVAL = float(os.getenv('AZURE_POLLING_INTERVAL', '0.25'))
+
 # Initialize OpenAI client
-openai_client = openai.OpenAI(api_key=OPENAI_API_KEY)
+openai_client = openai.OpenAI(
+    api_key=OPENAI_API_KEY,
+    max_retries=OPENAI_MAX_RETRIES,
+    http_client=openai_http_client
+)
+
+secondary_openai_client = None
+if OPENAI_SECONDARY_BASE_URL:
+    secondary_openai_client = openai.OpenAI(
+        api_key=OPENAI_SECONDARY_API_KEY or OPENAI_API_KEY,
+        base_url=OPENAI_SECONDARY_BASE_URL,
+        max_retries=OPENAI_MAX_RETRIES,
+        http_client=openai_http_client
+    )
+
+# Model used for filename generation; bump the prompt version whenever the prompt
+# changes so cached filenames from the old prompt are not reused
+FILENAME_MODEL = "gpt-4o-mini"
+FILENAME_PROMPT_VERSION = "v5"
+FILENAME_INSTRUCTIONS = (
+    "Generate a descriptive filename (no extension, max 50 characters) that makes clear "
+    "what the given document is about. Use only ASCII letters (A-Z), digits, spaces, "
+    "hyphens and underscores, even for documents in other languages."
+)
+FILENAME_SYSTEM_PROMPT = FILENAME_INSTRUCTIONS + " Return it in the \"filename\" field."
+# Batched requests apply the same instructions to each document in a JSON array
+FILENAME_BATCH_SYSTEM_PROMPT = FILENAME_INSTRUCTIONS + (
+    " You will receive a JSON array of documents, each with an id and text. Do this for "
+    "each document and respond with a JSON object mapping each document id to its filename."
+)
+
+# Generated filenames are restricted to ASCII letters, digits, spaces, hyphens and underscores
+FILENAME_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9 _-]+")
+MAX_FILENAME_LENGTH = 50
+VALID_FILENAME_PATTERN = re.compile(r"^[A-Za-z0-9 _-]{1,%d}$" % MAX_FILENAME_LENGTH)
+
+# Filenames are requested as structured JSON; invalid responses are retried
+# with the validation error as feedback, up to FILENAME_MAX_ATTEMPTS calls in total
+FILENAME_MAX_ATTEMPTS = 3
+FILENAME_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "document_filename",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"filename": {"type": "string"}},
+            "required": ["filename"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Documents can be named from their Title metadata, or from a title-like first
+# line when they are this short, without calling OpenAI. Titles left behind by
+# authoring tools ("Microsoft Word - x.docx", "Untitled") are ignored.
+SHORT_DOCUMENT_CHARS = 500
+TITLE_MIN_LENGTH = 5
+TITLE_MAX_LENGTH = 60
+GENERIC_TITLE_PATTERN = re.compile(
+    r"^(untitled|document\s*\d*$|microsoft (word|excel|powerpoint)\b)|\.(docx?|pdf|xlsx?|pptx?|txt|rtf|odt)$",
+    re.IGNORECASE
+)
+
+# Only the start of a document matters for naming it, so prompts are cut to this many tokens
+FILENAME_MAX_PROMPT_TOKENS = 200
+FILENAME_TOKEN_ENCODING = "o200k_base"  # tokenizer used by the gpt-4o model family
+token_encoding_lock = threading.Lock()
+token_encoding = None
+token_encoding_loaded = False
+
+# Recently generated filenames kept in memory in front of the disk cache,
+# keyed like the disk cache so repeat uploads skip the file read too
+FILENAME_MEMORY_CACHE_SIZE = 1024
+filename_memory_lock = threading.Lock()
+filename_memory_cache = OrderedDict()
+
+# Recent signature detection results keyed by a digest of the rendered page image,
+# so client retries of the same page skip the OpenAI Vision call
+SIGNATURE_CACHE_SIZE = 64
+signature_cache_lock = threading.Lock()
+signature_result_cache = OrderedDict()
+
+# Page images sent to OpenAI Vision. Vision bills by pixels and the image travels
+# base64-encoded, so a moderately scaled JPEG is far cheaper than a 144 DPI PNG
+# and just as good for spotting a signature
+SIGNATURE_IMAGE_FORMAT = 'JPEG'
+SIGNATURE_IMAGE_QUALITY = 1.5
+SIGNATURE_IMAGE_MAX_DIMENSION = 2048
+SIGNATURE_JPEG_QUALITY = 85
+
+# Markdown code fence the model sometimes wraps its JSON answer in
+SIGNATURE_RESPONSE_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+# In-flight work keyed by upload hash, so concurrent duplicate uploads are processed once
+inflight_lock = threading.Lock()
+inflight_requests = {}
+
+# Optional micro-batching of filename requests: concurrent single-document renames
+# arriving within FILENAME_BATCH_WINDOW_MS of each other (up to FILENAME_BATCH_SIZE)
+# share one batched OpenAI call. Disabled (0) by default since it adds the window
+# to the latency of every uncached rename.
+FILENAME_BATCH_WINDOW_MS = int(os.getenv('FILENAME_BATCH_WINDOW_MS', '0'))
+FILENAME_BATCH_SIZE = 8
+filename_batch_lock = threading.Lock()
+pending_filename_batch = None
+
+# Background rename jobs: the POST returns a job id right away and a worker pool runs
+# OCR and OpenAI; job state lives under cache/jobs so every worker process can see it
+RENAME_JOB_WORKERS = int(os.getenv('RENAME_JOB_WORKERS', '4'))
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+rename_job_executor = ThreadPoolExecutor(max_workers=RENAME_JOB_WORKERS)
 
 # Create upload directory
 UPLOAD_FOLDER = 'uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+# Create cache directory for content-addressable results (keyed by SHA-256 of the upload)
+CACHE_FOLDER = 'cache'
+os.makedirs(CACHE_FOLDER, exist_ok=True)
+
+# Disk budget for each cache namespace (analyses, OCR text and JSON, filenames);
+# once a namespace grows past it, the entries written longest ago are evicted.
+# Job records are exempt, since evicting one mid-job would make its polls 404;
+# finished jobs are expired by age instead. Writes check at most once per
+# CACHE_PRUNE_INTERVAL seconds per namespace.
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_MB', '2048')) * 1024 * 1024
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_HOURS', '24')) * 3600
+FINISHED_JOB_STATUSES = {'completed', 'failed'}
+CACHE_PRUNE_INTERVAL = 60
+cache_prune_lock = threading.Lock()
+cache_pruned_at = {}
+
+# PDFs whose text layer yields at least this many characters skip Azure OCR
+MIN_TEXT_LAYER_CHARS = 200
+TEXT_LAYER_MAX_PAGES = 3
 
 # Supported image formats
 SUPPORTED_IMAGE_FORMATS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.gif', '.webp'}
 SUPPORTED_PDF_FORMATS = {'.pdf'}
 
+# Save redacted PDFs with PyMuPDF's slowest, most thorough settings (full garbage
+# collection with duplicate merging plus content cleaning) instead of the fast default
+REDACTION_PARANOID_SAVE = os.getenv('REDACTION_PARANOID_SAVE', '').lower() in ('1', 'true', 'yes')
+
+# Points of slack when lining a text-layer search hit up with the page's word boxes
+WORD_MATCH_TOLERANCE = 1.0
+
+# Key-value pair keys that mark a value as sensitive, one precompiled alternation per
+# redaction type (matched against the lowercased key; 'tax file' covers 'tax file number')
+SENSITIVE_KEY_PATTERNS = {
+    'tfn': re.compile(r"tfn|tax file|tax number"),
+}
+
+# Image formats embedded into PDFs without re-encoding (as reported by Pillow)
+PDF_NATIVE_IMAGE_FORMATS = {'JPEG', 'PNG'}
+
 def is_image_file(filename):
     """
     Check if the file is a supported image format
     """
-    return any(filename.lower().endswith(ext) for ext in SUPPORTED_IMAGE_FORMATS)
+    return os.path.splitext(filename)[1].lower() in SUPPORTED_IMAGE_FORMATS
 
 def is_pdf_file(filename):
     """
     Check if the file is a PDF
     """
-    return filename.lower().endswith('.pdf')
+    return os.path.splitext(filename)[1].lower() in SUPPORTED_PDF_FORMATS
 
 def convert_image_to_pdf(image_path, output_path=None):
     """
-    Convert an image file to PDF format
+    Convert an image file to PDF format.
+    JPEG and PNG files are embedded by PyMuPDF as-is, without re-encoding.
     """
     try:
         # Open the image
         with Image.open(image_path) as img:
-            # Convert to RGB if necessary (for JPEG compatibility)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-            
             # Get image dimensions
             img_width, img_height = img.size
             
-            # Calculate PDF page size (A4 by default)
-            page_width, page_height = A4
-            
-            # Calculate scaling to fit image on page with margins
-            margin = 50  # 50 points margin
-            max_width = page_width - 2 * margin
-            max_height = page_height - 2 * margin
-            
-            # Calculate scaling factor
-            scale_x = max_width / img_width
-            scale_y = max_height / img_height
-            scale = min(scale_x, scale_y, 1.0)  # Don't scale up, only down
-            
-            # Calculate final dimensions
-            final_width = img_width * scale
-            final_height = img_height * scale
-            
-            # Calculate position to center the image
-            x_offset = (page_width - final_width) / 2
-            y_offset = (page_height - final_height) / 2
-            
-            # Create PDF
-            if output_path is None:
-                output_path = image_path.rsplit('.', 1)[0] + '.pdf'
-            
-            c = canvas.Canvas(output_path, pagesize=A4)
-            
-            # Draw the image
-            c.drawImage(ImageReader(img), x_offset, y_offset, width=final_width, height=final_height)
-            c.save()
+            # Formats MuPDF can't embed directly are converted to PNG first
+            if img.format in PDF_NATIVE_IMAGE_FORMATS:
+                image_data = None
+            else:
+                if img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+                buffer = io.BytesIO()
+                img.save(buffer, format='PNG')
+                image_data = buffer.getvalue()
+        
+        # Calculate PDF page size (A4 by default)
+        page_width, page_height = fitz.paper_size('a4')
+        
+        # Calculate scaling to fit image on page with margins
+        margin = 50  # 50 points margin
+        max_width = page_width - 2 * margin
+        max_height = page_height - 2 * margin
+        
+        # Calculate scaling factor
+        scale_x = max_width / img_width
+        scale_y = max_height / img_height
+        scale = min(scale_x, scale_y, 1.0)  # Don't scale up, only down
+        
+        # Calculate final dimensions
+        final_width = img_width * scale
+        final_height = img_height * scale
+        
+        # Calculate position to center the image
+        x_offset = (page_width - final_width) / 2
+        y_offset = (page_height - final_height) / 2
+        
+        # Create PDF
+        if output_path is None:
+            output_path = image_path.rsplit('.', 1)[0] + '.pdf'
+        
+        with fitz.open() as doc:
+            page = doc.new_page(width=page_width, height=page_height)
             
-            print(f"Image converted to PDF: {output_path}")
-            return output_path
+            # Draw the image (PyMuPDF measures from the top-left corner)
+            image_rect = fitz.Rect(x_offset, y_offset, x_offset + final_width, y_offset + final_height)
+            if image_data is None:
+                page.insert_image(image_rect, filename=image_path)
+            else:
+                page.insert_image(image_rect, stream=image_data)
+            doc.save(output_path, deflate=True)
+        
+        logger.info("Image converted to PDF: %s", output_path)
+        return output_path
             
     except Exception as e:
         raise Exception(f"Error converting image to PDF: {str(e)}")
@@ -129,107 +404,957 @@ def process_file_to_pdf(file_path, original_filename):
     else:
         raise Exception(f"Unsupported file format. Supported formats: {', '.join(SUPPORTED_IMAGE_FORMATS | SUPPORTED_PDF_FORMATS)}")
 
-def extract_text_from_pdf(pdf_path):
+def load_pdf_bytes(file_bytes, original_filename):
+    """
+    Return an uploaded file as PDF bytes. PDFs are returned as-is without
+    touching the disk; images are converted via a temporary file.
+    """
+    if is_pdf_file(original_filename):
+        return file_bytes
+
+    pdf_path = None
+    with tempfile.NamedTemporaryFile(dir=UPLOAD_FOLDER, suffix=os.path.splitext(original_filename)[1], delete=False) as temp_file:
+        temp_file.write(file_bytes)
+        temp_path = temp_file.name
+
+    try:
+        pdf_path = process_file_to_pdf(temp_path, original_filename)
+        with open(pdf_path, 'rb') as f:
+            return f.read()
+    finally:
+        remove_file(temp_path)
+        if pdf_path:
+            remove_file(pdf_path)
+
+def remove_file(path):
+    """
+    Delete a file if it exists, with a single unlink instead of a stat and a remove
+    """
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def write_new_file(directory, base_name, extension, data):
+    """
+    Create a new file and write data to it without overwriting anything.
+    Uses an exclusive create, so there is no exists-then-write race; if the
+    name is taken, a short random suffix is added instead of probing
+    name_1, name_2, ... one stat call at a time.
+    """
+    flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, 'O_BINARY', 0)
+    file_path = os.path.join(directory, f"{base_name}{extension}")
+    try:
+        fd = os.open(file_path, flags, 0o644)
+    except FileExistsError:
+        file_path = os.path.join(directory, f"{base_name}_{uuid.uuid4().hex[:6]}{extension}")
+        fd = os.open(file_path, flags, 0o644)
+    
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return file_path
+
+def compute_content_hash(data):
+    """
+    Compute the SHA-256 hex digest used as a content-addressable cache key
+    """
+    return hashlib.sha256(data).hexdigest()
+
+def read_cache(namespace, key):
+    """
+    Read a cached entry, returning None on a cache miss
+    """
+    cache_path = os.path.join(CACHE_FOLDER, namespace, key)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def write_cache(namespace, key, content):
+    """
+    Write a cache entry atomically so concurrent readers never see a partial file.
+    Cache failures are logged and ignored since the cache is only an optimization.
+    """
+    cache_dir = os.path.join(CACHE_FOLDER, namespace)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, os.path.join(cache_dir, key))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        prune_cache(namespace)
+    except OSError as e:
+        logger.warning("Could not write cache entry %s/%s: %s", namespace, key, str(e))
+
+def extract_text_layer(pdf_bytes, max_pages=TEXT_LAYER_MAX_PAGES):
+    """
+    Extract the embedded text layer from the first few pages using PyMuPDF.
+    Returns an empty string for scanned/image-only PDFs.
+    """
+    try:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            text_content = "\n".join(doc[i].get_text() for i in range(min(max_pages, len(doc))))
+        return text_content.strip()
+    except Exception as e:
+        logger.warning("Could not read PDF text layer: %s", str(e))
+        return ""
+
+def is_usable_text_layer(text_content):
+    """
+    Check whether an extracted text layer is long and clean enough to skip OCR.
+    Broken font encodings tend to produce control or replacement characters.
+    """
+    if len(text_content) < MIN_TEXT_LAYER_CHARS:
+        return False
+    printable = sum(1 for c in text_content if (c.isprintable() or c.isspace()) and c != '\ufffd')
+    return printable / len(text_content) >= 0.95
+
+def delete_cache(namespace, key):
+    """
+    Evict a cache entry if it exists
+    """
+    remove_file(os.path.join(CACHE_FOLDER, namespace, key))
+
+def is_prune_due(namespace):
+    """
+    Throttle directory scans of a cache namespace to once per CACHE_PRUNE_INTERVAL
+    """
+    now = time.monotonic()
+    with cache_prune_lock:
+        if now - cache_pruned_at.get(namespace, float('-inf')) < CACHE_PRUNE_INTERVAL:
+            return False
+        cache_pruned_at[namespace] = now
+        return True
+
+def prune_cache(namespace, max_bytes=CACHE_MAX_BYTES):
+    """
+    Evict entries of a cache namespace, least recently written first (by
+    mtime, so reads don't refresh an entry), until it fits in max_bytes.
+    Called from write_cache, which only runs after a slow Azure or OpenAI call.
+    """
+    if namespace == 'jobs':
+        prune_finished_jobs()
+        return
+    if not is_prune_due(namespace):
+        return
+    
+    entries = []
+    total_bytes = 0
+    try:
+        with os.scandir(os.path.join(CACHE_FOLDER, namespace)) as it:
+            for entry in it:
+                # Skip entries still being written by write_cache
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_bytes += stat.st_size
+    except FileNotFoundError:
+        return
+    
+    if total_bytes <= max_bytes:
+        return
+    
+    entries.sort()
+    for _, size, path in entries:
+        if total_bytes <= max_bytes:
+            break
+        remove_file(path)
+        total_bytes -= size
+
+def prune_finished_jobs(max_age=JOB_RETENTION_SECONDS):
+    """
+    Delete the records of completed and failed rename jobs last updated more
+    than max_age seconds ago. Queued and processing jobs are never removed.
+    """
+    if not is_prune_due('jobs'):
+        return
+    
+    cutoff = time.time() - max_age
+    try:
+        with os.scandir(os.path.join(CACHE_FOLDER, 'jobs')) as it:
+            for entry in it:
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    if entry.stat().st_mtime >= cutoff:
+                        continue
+                    with open(entry.path, 'r', encoding='utf-8') as f:
+                        status = json.loads(f.read()).get('status')
+                except (FileNotFoundError, ValueError):
+                    continue
+                if status in FINISHED_JOB_STATUSES:
+                    remove_file(entry.path)
+    except FileNotFoundError:
+        return
+
+def is_transient_error(error):
+    """
+    Check whether an Azure or OpenAI error is a rate limit, timeout or server
+    error that another endpoint might not have
+    """
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    if isinstance(error, (ServiceRequestError, ServiceResponseError)):
+        return True
+    if isinstance(error, HttpResponseError):
+        return error.status_code in TRANSIENT_STATUS_CODES
+    return False
+
+def create_chat_completion(**kwargs):
     """
-    Extract text from PDF using Azure Form Recognizer
+    Create an OpenAI chat completion, failing over to the secondary endpoint
+    when the primary is rate limited or unavailable after its own retries
     """
     try:
-        with open(pdf_path, "rb") as f:
+        return openai_client.chat.completions.create(**kwargs)
+    except Exception as e:
+        if secondary_openai_client is None or not is_transient_error(e):
+            raise
+        logger.warning("Primary OpenAI endpoint failed (%s), retrying on secondary endpoint", str(e))
+        response = secondary_openai_client.chat.completions.create(**kwargs)
+        logger.info("OpenAI request served by secondary endpoint")
+        return response
+
+def analyze_document(document, model_id=ANALYSIS_MODEL_ID):
+    """
+    Run an Azure Form Recognizer analysis and wait for the result.
+    Polls every AZURE_POLLING_INTERVAL seconds instead of the SDK default of 5,
+    so short documents return as soon as the service has finished.
+    """
+    # Bound in-flight Azure analyses across all request threads to stay under the quota
+    with azure_semaphore:
+        try:
             poller = document_analysis_client.begin_analyze_document(
-                "prebuilt-document", document=f
+                model_id, document=document, polling_interval=AZURE_POLLING_INTERVAL
+            )
+            return poller.result()
+        except Exception as e:
+            if secondary_document_analysis_client is None or not is_transient_error(e):
+                raise
+            logger.warning("Primary Azure endpoint failed (%s), retrying on secondary endpoint", str(e))
+            document.seek(0)
+            poller = secondary_document_analysis_client.begin_analyze_document(
+                model_id, document=document, polling_interval=AZURE_POLLING_INTERVAL
             )
-        result = poller.result()
+            result = poller.result()
+            logger.info("Azure analysis served by secondary endpoint")
+            return result
+
+def analyze_pdf_bytes(pdf_bytes, model_id=ANALYSIS_MODEL_ID):
+    """
+    Analyze PDF bytes with Azure, caching the serialized result by model and
+    content hash so a document seen before (e.g. redacted after an OCR export)
+    doesn't go back to Azure. Text-only analyses also accept a cached
+    prebuilt-document result, which contains the same lines.
+    """
+    content_hash = compute_content_hash(pdf_bytes)
+    candidate_models = [model_id] + ([ANALYSIS_MODEL_ID] if model_id == TEXT_MODEL_ID else [])
+    for candidate_model in candidate_models:
+        cached = read_cache('analyze_results', f"{candidate_model}-{content_hash}")
+        if cached is not None:
+            try:
+                result = AnalyzeResult.from_dict(orjson.loads(cached))
+                logger.info("Using cached %s analysis for %s", candidate_model, content_hash)
+                return result
+            except Exception as e:
+                logger.warning("Ignoring unreadable cached analysis %s-%s: %s", candidate_model, content_hash, str(e))
+
+    result = analyze_document(io.BytesIO(pdf_bytes), model_id)
+    write_cache('analyze_results', f"{model_id}-{content_hash}", orjson.dumps(result.to_dict()).decode('utf-8'))
+    return result
+
+def split_pdf(pdf_bytes, pages_per_chunk=None):
+    """
+    Split PDF bytes into chunks of at most pages_per_chunk pages so long
+    documents can be analyzed concurrently. Short documents, and anything
+    PyMuPDF cannot open, are returned as a single chunk.
+    """
+    pages_per_chunk = pages_per_chunk or OCR_PAGES_PER_REQUEST
+    try:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            page_count = len(doc)
+            if page_count <= pages_per_chunk:
+                return [pdf_bytes]
+            
+            chunks = []
+            for start in range(0, page_count, pages_per_chunk):
+                end = min(start + pages_per_chunk, page_count) - 1
+                with fitz.open() as chunk:
+                    chunk.insert_pdf(doc, from_page=start, to_page=end)
+                    # Keep the trailer /ID fixed so re-splitting the same PDF yields
+                    # identical chunk bytes and the per-chunk analysis cache hits
+                    chunks.append(chunk.tobytes(no_new_id=True))
+            return chunks
+    except Exception as e:
+        logger.warning("Could not split PDF, analyzing as a single document: %s", str(e))
+        return [pdf_bytes]
+
+def analyze_pdf_chunks(pdf_bytes, model_id=ANALYSIS_MODEL_ID):
+    """
+    Analyze a PDF with Azure, splitting long documents into page chunks that
+    are analyzed concurrently. Returns one result per chunk, in page order.
+    """
+    chunks = split_pdf(pdf_bytes)
+    if len(chunks) == 1:
+        return [analyze_pdf_bytes(pdf_bytes, model_id)]
+    
+    logger.info("Analyzing %d page chunks concurrently...", len(chunks))
+    futures = [ocr_executor.submit(analyze_pdf_bytes, chunk, model_id) for chunk in chunks]
+    return [future.result() for future in futures]
+
+def merge_analyze_results(results):
+    """
+    Merge per-chunk Azure results into the first one, renumbering pages and
+    key-value bounding regions to their position in the whole document.
+    Only pages and key-value pairs are merged; content and spans still refer
+    to the first chunk.
+    """
+    merged = results[0]
+    page_offset = len(merged.pages)
+    for result in results[1:]:
+        for page in result.pages:
+            page.page_number += page_offset
+            merged.pages.append(page)
+        
+        if result.key_value_pairs:
+            if merged.key_value_pairs is None:
+                merged.key_value_pairs = []
+            for pair in result.key_value_pairs:
+                for element in (pair.key, pair.value):
+                    for region in (element.bounding_regions or []) if element else []:
+                        region.page_number += page_offset
+                merged.key_value_pairs.append(pair)
+        
+        page_offset += len(result.pages)
+    return merged
+
+def analyze_pdf(pdf_bytes, model_id=ANALYSIS_MODEL_ID):
+    """
+    Analyze a whole PDF with Azure, page-chunked and concurrent for long
+    documents, and return a single result covering every page
+    """
+    return merge_analyze_results(analyze_pdf_chunks(pdf_bytes, model_id))
+
+def extract_text_from_pdf(pdf_bytes):
+    """
+    Extract text from PDF bytes using Azure Form Recognizer's lightweight
+    prebuilt-read OCR model (only the line text is needed here).
+    Long documents are split into page chunks that are analyzed concurrently,
+    and the text is reassembled in page order.
+    """
+    try:
+        results = analyze_pdf_chunks(pdf_bytes, TEXT_MODEL_ID)
         
         # Extract text content
         text_content = ""
-        for page in result.pages:
-            for line in page.lines:
-                text_content += line.content + "\n"
+        for result in results:
+            for page in result.pages:
+                for line in page.lines:
+                    text_content += line.content + "\n"
         
         return text_content.strip()
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {str(e)}")
 
+def clean_filename(filename):
+    """
+    Keep only alphanumeric characters, spaces, hyphens and underscores, replace
+    spaces with underscores, and cap the length at MAX_FILENAME_LENGTH
+    """
+    filename = FILENAME_UNSAFE_CHARS.sub("", filename)
+    return filename.replace(" ", "_")[:MAX_FILENAME_LENGTH]
+
+def remember_filename(cache_key, filename):
+    """
+    Add a filename to the in-process LRU, evicting the least recently used entry when full
+    """
+    with filename_memory_lock:
+        filename_memory_cache[cache_key] = filename
+        filename_memory_cache.move_to_end(cache_key)
+        if len(filename_memory_cache) > FILENAME_MEMORY_CACHE_SIZE:
+            filename_memory_cache.popitem(last=False)
+
+def store_cached_filename(cache_key, filename):
+    """
+    Cache a generated filename in memory and on disk (shared by all worker processes)
+    """
+    remember_filename(cache_key, filename)
+    write_cache('filenames', cache_key, json.dumps({
+        'filename': filename,
+        'model': FILENAME_MODEL,
+        'ts': time.time()
+    }))
+
+def get_cached_filename(cache_key):
+    """
+    Look up a previously generated filename, checking the in-process LRU before
+    the disk cache and revalidating disk entries before use.
+    Invalid entries are evicted so the caller falls through to OpenAI.
+    """
+    with filename_memory_lock:
+        filename = filename_memory_cache.get(cache_key)
+        if filename is not None:
+            filename_memory_cache.move_to_end(cache_key)
+            return filename
+
+    cached = read_cache('filenames', cache_key)
+    if cached is None:
+        return None
+
+    try:
+        filename = json.loads(cached)['filename']
+        if filename and clean_filename(filename) == filename:
+            remember_filename(cache_key, filename)
+            return filename
+    except (ValueError, KeyError, TypeError):
+        pass
+
+    logger.info("Evicting invalid cached filename entry %s", cache_key)
+    delete_cache('filenames', cache_key)
+    return None
+
+def extract_document_text(pdf_bytes, content_hash, check_text_layer=True):
+    """
+    Extract the text used for renaming. Uses the PDF's embedded text layer when
+    it has a usable one, otherwise Azure OCR with results cached by upload hash.
+    """
+    if check_text_layer:
+        text_layer = extract_text_layer(pdf_bytes)
+        if is_usable_text_layer(text_layer):
+            logger.info("Using embedded PDF text layer, skipping Azure OCR")
+            return text_layer
+
+    extracted_text = read_cache('ocr_text', content_hash)
+    if extracted_text is not None:
+        logger.info("Using cached OCR text for %s", content_hash)
+        return extracted_text
+
+    logger.info("Extracting text from PDF...")
+    extracted_text = extract_text_from_pdf(pdf_bytes)
+    if extracted_text:
+        write_cache('ocr_text', content_hash, extracted_text)
+    return extracted_text
+
+def prepare_document_for_rename(file_bytes, original_filename):
+    """
+    Convert an upload to PDF bytes and extract its text for renaming
+    """
+    pdf_bytes = load_pdf_bytes(file_bytes, original_filename)
+    extracted_text = extract_document_text(
+        pdf_bytes, compute_content_hash(file_bytes), is_pdf_file(original_filename)
+    )
+    return pdf_bytes, extracted_text
+
+def generate_filename_for_document(pdf_bytes, content_hash, check_text_layer=True):
+    """
+    Extract a document's text and generate a filename for it.
+    Returns None if no text could be extracted.
+    """
+    # Extract text from the PDF's own text layer if it has one, otherwise
+    # fall back to Azure OCR unless this exact upload was seen before
+    extracted_text = extract_document_text(pdf_bytes, content_hash, check_text_layer)
+    if not extracted_text:
+        return None
+
+    # Skip the LLM when the document already tells us its title
+    heuristic_filename = get_heuristic_filename(pdf_bytes, extracted_text)
+    if heuristic_filename:
+        logger.info("Using document title as filename: %s", heuristic_filename)
+        return heuristic_filename
+
+    logger.info("Generating new filename with OpenAI...")
+    return generate_filename_batched(extracted_text)
+
+def get_cached_document_filename(pdf_bytes, content_hash, check_text_layer=True):
+    """
+    Resolve a document's filename from local data only (text layer, cached OCR
+    text and cached filenames). Returns None if Azure or OpenAI would be needed.
+    """
+    extracted_text = extract_text_layer(pdf_bytes) if check_text_layer else ''
+    if not is_usable_text_layer(extracted_text):
+        extracted_text = read_cache('ocr_text', content_hash)
+        if not extracted_text:
+            return None
+
+    heuristic_filename = get_heuristic_filename(pdf_bytes, extracted_text)
+    if heuristic_filename:
+        return heuristic_filename
+
+    return get_cached_filename(get_filename_cache_key(extracted_text))
+
+def is_plausible_title(text):
+    """
+    Check whether a metadata title or first line looks like a real document title
+    """
+    return (
+        TITLE_MIN_LENGTH <= len(text) <= TITLE_MAX_LENGTH
+        and any(c.isalpha() for c in text)
+        and not GENERIC_TITLE_PATTERN.search(text)
+    )
+
+def get_heuristic_filename(pdf_bytes, extracted_text):
+    """
+    Name a document without OpenAI when possible: use the PDF's Title metadata,
+    or for short documents a title-like first line.
+    Returns None when neither is usable.
+    """
+    try:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            title = ((doc.metadata or {}).get('title') or '').strip()
+    except Exception:
+        title = ''
+
+    if is_plausible_title(title):
+        filename = clean_filename(title)
+        if filename:
+            return filename
+
+    if len(extracted_text) < SHORT_DOCUMENT_CHARS:
+        first_line = extracted_text.strip().split("\n", 1)[0].strip()
+        if is_plausible_title(first_line) and first_line[0].isupper() and first_line[-1] not in '.,;:!?':
+            filename = clean_filename(first_line)
+            if filename:
+                return filename
+
+    return None
+
+def run_once_per_key(key, func, *args):
+    """
+    Run func(*args) once for concurrent callers sharing the same key.
+    The first caller does the work; callers arriving while it is in flight
+    wait for and share its result (or exception).
+    """
+    with inflight_lock:
+        future = inflight_requests.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = Future()
+            inflight_requests[key] = future
+
+    if not is_owner:
+        logger.info("Waiting for in-flight request with key %s", key)
+        return future.result()
+
+    try:
+        result = func(*args)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with inflight_lock:
+            del inflight_requests[key]
+
+def write_job_state(job_id, status, **fields):
+    """
+    Persist a rename job's state on disk so any worker process can answer polls for it
+    """
+    write_cache('jobs', job_id, json.dumps({'status': status, 'updated': time.time(), **fields}))
+
+def read_job_state(job_id):
+    """
+    Read a rename job's state, returning None for unknown or malformed job ids
+    """
+    if not JOB_ID_PATTERN.match(job_id):
+        return None
+    state = read_cache('jobs', job_id)
+    return json.loads(state) if state is not None else None
+
+def run_rename_job(job_id, pdf_bytes, content_hash, check_text_layer=True):
+    """
+    Background worker for a queued rename job: extract text, generate the
+    filename, write the renamed PDF and record where it is
+    """
+    write_job_state(job_id, 'processing')
+    try:
+        new_filename = run_once_per_key(
+            content_hash, generate_filename_for_document,
+            pdf_bytes, content_hash, check_text_layer
+        )
+        if not new_filename:
+            write_job_state(job_id, 'failed', error='No text could be extracted from the PDF')
+            return
+
+        new_file_path = write_new_file(UPLOAD_FOLDER, new_filename, '.pdf', pdf_bytes)
+        write_job_state(job_id, 'completed', filename=new_filename, result_path=new_file_path)
+    except Exception as e:
+        logger.error("Rename job %s failed: %s", job_id, str(e))
+        write_job_state(job_id, 'failed', error=str(e))
+
+def get_token_encoding():
+    """
+    Load the tokenizer for the filename model on first use, so workers boot
+    even without network access. tiktoken downloads its BPE file (without a
+    timeout) unless it is already in TIKTOKEN_CACHE_DIR; the lock makes that
+    happen once per process, and a failure is remembered as None instead of
+    being retried on every request.
+    """
+    global token_encoding, token_encoding_loaded
+    with token_encoding_lock:
+        if not token_encoding_loaded:
+            try:
+                token_encoding = tiktoken.get_encoding(FILENAME_TOKEN_ENCODING)
+            except Exception as e:
+                logger.warning("Could not load the %s tokenizer, prompts will be truncated by characters: %s",
+                               FILENAME_TOKEN_ENCODING, str(e))
+            token_encoding_loaded = True
+    return token_encoding
+
+def normalize_document_text(text_content, max_tokens=FILENAME_MAX_PROMPT_TOKENS):
+    """
+    Collapse whitespace and drop repeated lines (page headers, footers) so the
+    token budget is spent on actual content, keeping only enough text to fill
+    max_tokens tokens.
+    """
+    # Tokens average ~4 characters, so this bounds the work on long documents
+    max_chars = max_tokens * 8
+    seen_lines = set()
+    lines = []
+    total_chars = 0
+    for line in text_content.splitlines():
+        line = " ".join(line.split())
+        if not line or line in seen_lines:
+            continue
+        seen_lines.add(line)
+        lines.append(line)
+        total_chars += len(line) + 1
+        if total_chars >= max_chars:
+            break
+    return "\n".join(lines)
+
+def build_document_snippet(text_content, max_tokens=FILENAME_MAX_PROMPT_TOKENS):
+    """
+    Reduce document text to the first max_tokens tokens sent to OpenAI
+    """
+    text_content = normalize_document_text(text_content, max_tokens)
+    encoding = get_token_encoding()
+    if encoding is None:
+        return text_content[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text_content)[:max_tokens])
+
+def get_filename_cache_key(text_content):
+    """
+    Build the filename cache key from the model, prompt version and normalized
+    document text. The key does not depend on the tokenizer, so it is the same
+    whether or not the encoding could be loaded.
+    """
+    normalized_text = normalize_document_text(text_content)
+    return compute_content_hash(
+        f"{FILENAME_MODEL}\x00{FILENAME_PROMPT_VERSION}\x00{normalized_text}".encode('utf-8')
+    )
+
+def parse_filename_response(raw_response):
+    """
+    Parse and validate a structured filename response from OpenAI.
+    Raises ValueError describing the problem so it can be fed back to the model.
+    """
+    try:
+        data = json.loads(raw_response)
+    except ValueError:
+        raise ValueError("the response was not valid JSON")
+    
+    filename = data.get('filename') if isinstance(data, dict) else None
+    if not isinstance(filename, str):
+        raise ValueError('the response must be a JSON object with a string "filename" field')
+    
+    return validate_filename(filename)
+
+def validate_filename(filename):
+    """
+    Check a generated filename against VALID_FILENAME_PATTERN, returning it stripped.
+    Accents are dropped first ("Résumé" becomes "Resume") so they don't cost a
+    retry. Raises ValueError describing the problem.
+    """
+    filename = "".join(
+        c for c in unicodedata.normalize('NFKD', filename) if not unicodedata.combining(c)
+    ).strip()
+    if not VALID_FILENAME_PATTERN.match(filename):
+        raise ValueError(
+            f'"{filename}" must be 1-{MAX_FILENAME_LENGTH} characters of ASCII letters (A-Z), '
+            f'digits, spaces, hyphens and underscores'
+        )
+    return filename
+
+def log_prompt_cache_usage(response):
+    """
+    Log how many prompt tokens were served from OpenAI's automatic prompt cache.
+    Older API versions and SDKs don't report cached tokens, so they are read defensively.
+    """
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return
+    details = getattr(usage, 'prompt_tokens_details', None)
+    if details is None and getattr(usage, 'model_extra', None):
+        details = usage.model_extra.get('prompt_tokens_details')
+    if isinstance(details, dict):
+        cached_tokens = details.get('cached_tokens') or 0
+    else:
+        cached_tokens = getattr(details, 'cached_tokens', None) or 0
+    logger.info("OpenAI prompt tokens: %d (%d cached)", usage.prompt_tokens, cached_tokens)
+
 def generate_filename_with_openai(text_content):
     """
-    Use OpenAI to understand context and generate an appropriate filename
+    Use OpenAI to understand context and generate an appropriate filename.
+    Results are cached by (model, prompt version, document snippet) so
+    duplicate documents skip the OpenAI round-trip.
     """
     try:
-        prompt = f"""
-        Based on the following document content, generate a concise, descriptive filename (without extension) that captures the main topic or purpose of the document.
-        
-        Document content:
-        {text_content[:2000]}  # Limit to first 2000 characters
-        
-        Requirements:
-        - Filename should be descriptive but concise (max 50 characters)
-        - Use only alphanumeric characters, spaces, hyphens, and underscores
-        - Avoid special characters
-        - Make it clear what the document is about
+        cache_key = get_filename_cache_key(text_content)
+        cached_filename = get_cached_filename(cache_key)
+        if cached_filename:
+            logger.info("Using cached filename for %s", cache_key)
+            return cached_filename
+
+        snippet = build_document_snippet(text_content)
+
+        # The instructions are identical for every document, so they live in the
+        # system message as a stable prefix; only the document itself varies
+        messages = [
+            {"role": "system", "content": FILENAME_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Document:\n{snippet}"}
+        ]
         
-        Return only the filename without any explanation or quotes.
-        """
+        # Request structured output and validate it; on a validation failure the
+        # error is fed back to the model so it can correct itself
+        filename = None
+        for attempt in range(FILENAME_MAX_ATTEMPTS):
+            response = create_chat_completion(
+                model=FILENAME_MODEL,
+                messages=messages,
+                response_format=FILENAME_RESPONSE_FORMAT,
+                max_tokens=40,
+                temperature=0,
+                seed=0
+            )
+            log_prompt_cache_usage(response)
+            raw_response = response.choices[0].message.content or ""
+            try:
+                filename = parse_filename_response(raw_response)
+                break
+            except ValueError as e:
+                logger.warning("Invalid filename response on attempt %d: %s", attempt + 1, str(e))
+                messages = messages + [
+                    {"role": "assistant", "content": raw_response},
+                    {"role": "user", "content": f"Your output had an error: {str(e)}. Fix it and respond again."}
+                ]
         
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that generates descriptive filenames based on document content."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=50,
-            temperature=0.3
-        )
+        if filename is None:
+            # Out of attempts: salvage what we can from the last response
+            try:
+                filename = str(json.loads(raw_response).get('filename', ''))
+            except (ValueError, AttributeError):
+                filename = raw_response
         
-        filename = response.choices[0].message.content.strip()
         # Clean the filename
-        filename = "".join(c for c in filename if c.isalnum() or c in " -_")
-        filename = filename.replace(" ", "_")
-        
-        return filename if filename else "document"
+        filename = clean_filename(filename)
+
+        if not filename:
+            return "document"
+
+        store_cached_filename(cache_key, filename)
+        return filename
         
     except Exception as e:
         raise Exception(f"Error generating filename with OpenAI: {str(e)}")
 
-def extract_text_and_coordinates_from_pdf(pdf_path):
+def generate_filenames_with_openai(text_contents):
     """
-    Extract text and coordinates from PDF using Azure Form Recognizer
-    Returns a list of dictionaries with text content and coordinates
+    Generate filenames for several documents with a single OpenAI call.
+    Returns filenames in the same order as text_contents. Cached filenames are
+    reused, and any document the batched response does not cover, or covers
+    with an invalid filename, falls back to generate_filename_with_openai.
+    Both paths share the cache, so the batch uses the same instructions,
+    deterministic sampling and validation as the single-document path.
     """
     try:
-        with open(pdf_path, "rb") as f:
-            poller = document_analysis_client.begin_analyze_document(
-                "prebuilt-document", document=f
+        filenames = [None] * len(text_contents)
+        documents = []
+        for i, text_content in enumerate(text_contents):
+            cached_filename = get_cached_filename(get_filename_cache_key(text_content))
+            if cached_filename:
+                filenames[i] = cached_filename
+            else:
+                documents.append({'id': str(i), 'text': build_document_snippet(text_content)})
+
+        if documents:
+            response = create_chat_completion(
+                model=FILENAME_MODEL,
+                messages=[
+                    {"role": "system", "content": FILENAME_BATCH_SYSTEM_PROMPT},
+                    {"role": "user", "content": json.dumps(documents)}
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=20 * len(documents) + 20,
+                temperature=0,
+                seed=0
             )
-        result = poller.result()
-        
-        # Extract text content with coordinates
-        text_elements = []
-        for page_num, page in enumerate(result.pages):
-            for line in page.lines:
-                for word in line.words:
-                    # Convert coordinates from inches to points (1 inch = 72 points)
-                    # Azure returns coordinates in inches, we need to convert to points for PDF manipulation
-                    x1 = word.polygon[0].x * 72  # Convert to points
-                    y1 = word.polygon[0].y * 72
-                    x2 = word.polygon[2].x * 72
-                    y2 = word.polygon[2].y * 72
-                    
-                    text_elements.append({
-                        'text': word.content,
-                        'page': page_num,
-                        'coordinates': {
-                            'x1': x1,
-                            'y1': y1,
-                            'x2': x2,
-                            'y2': y2,
-                            'width': x2 - x1,
-                            'height': y2 - y1
-                        }
-                    })
-        
-        return text_elements
+
+            log_prompt_cache_usage(response)
+            try:
+                generated = json.loads(response.choices[0].message.content)
+            except ValueError:
+                logger.warning("Could not parse batched filename response, falling back to per-document calls")
+                generated = {}
+            if not isinstance(generated, dict):
+                generated = {}
+
+            for document in documents:
+                i = int(document['id'])
+                try:
+                    filename = clean_filename(validate_filename(str(generated.get(document['id']) or '')))
+                except ValueError as e:
+                    logger.warning("Invalid batched filename for document %s, retrying it on its own: %s", document['id'], str(e))
+                    continue
+                store_cached_filename(get_filename_cache_key(text_contents[i]), filename)
+                filenames[i] = filename
+
+        for i, filename in enumerate(filenames):
+            if not filename:
+                filenames[i] = generate_filename_with_openai(text_contents[i])
+
+        return filenames
+
     except Exception as e:
-        raise Exception(f"Error extracting text and coordinates from PDF: {str(e)}")
+        raise Exception(f"Error generating filenames with OpenAI: {str(e)}")
+
+def generate_filename_batched(text_content):
+    """
+    Generate a filename, coalescing concurrent requests into one batched OpenAI
+    call when FILENAME_BATCH_WINDOW_MS is set. The first caller of a batch waits
+    for the window (or until the batch is full), makes the call and hands each
+    waiting caller its result.
+    """
+    global pending_filename_batch
+
+    if FILENAME_BATCH_WINDOW_MS <= 0:
+        return generate_filename_with_openai(text_content)
+
+    # Cache hits shouldn't wait for the batch window
+    cached_filename = get_cached_filename(get_filename_cache_key(text_content))
+    if cached_filename:
+        return cached_filename
+
+    future = Future()
+    with filename_batch_lock:
+        is_leader = pending_filename_batch is None
+        if is_leader:
+            pending_filename_batch = {'items': [], 'full': threading.Event()}
+        batch = pending_filename_batch
+        batch['items'].append((text_content, future))
+        if len(batch['items']) >= FILENAME_BATCH_SIZE:
+            pending_filename_batch = None
+            batch['full'].set()
+
+    if is_leader:
+        batch['full'].wait(FILENAME_BATCH_WINDOW_MS / 1000)
+        with filename_batch_lock:
+            if pending_filename_batch is batch:
+                pending_filename_batch = None
+
+        items = batch['items']
+        logger.info("Generating filenames for a batch of %d documents", len(items))
+        try:
+            if len(items) == 1:
+                filenames = [generate_filename_with_openai(text_content)]
+            else:
+                filenames = generate_filenames_with_openai([text for text, _ in items])
+            for (_, item_future), filename in zip(items, filenames):
+                item_future.set_result(filename)
+        except Exception as e:
+            for _, item_future in items:
+                item_future.set_exception(e)
+
+    return future.result()
+
+def flatten_polygon(polygon):
+    """
+    Flatten an Azure polygon (a sequence of points) into [x1, y1, x2, y2, ...]
+    """
+    return [coordinate for point in polygon for coordinate in (point.x, point.y)]
+
+def polygons_to_array(items):
+    """
+    Flatten the polygons of a page's lines or words into an (n, 8) float array
+    built in a single pass, one row of x1, y1, ..., x4, y4 per item.
+    Azure returns quadrilaterals; if any polygon has another number of points
+    (or none), each one is flattened separately with flatten_polygon instead,
+    since a single flat buffer would shift rows onto the wrong items.
+    """
+    if not all(len(item.polygon or ()) == 4 for item in items):
+        return [flatten_polygon(item.polygon or ()) for item in items]
+    return np.fromiter(
+        (coordinate for item in items for point in item.polygon for coordinate in (point.x, point.y)),
+        dtype=np.float64,
+        count=8 * len(items)
+    ).reshape(-1, 8)
+
+def iter_pages(result):
+    """
+    Lazily convert the pages of an Azure result to dicts of lines and words.
+    Polygons are flattened per page in one pass; the array rows are serialized
+    by orjson directly, without .tolist().
+    """
+    for page_num, page in enumerate(result.pages):
+        page_data = {'pageNumber': page_num + 1}
+        
+        # Extract lines
+        page_data['lines'] = [
+            {'content': line.content, 'polygon': polygon, 'confidence': 1.0}
+            for line, polygon in zip(page.lines, polygons_to_array(page.lines))
+        ]
+        
+        # Extract words directly from the page
+        page_data['words'] = [
+            {'content': word.content, 'polygon': polygon, 'confidence': 1.0}
+            for word, polygon in zip(page.words, polygons_to_array(page.words))
+        ]
+        
+        yield page_data
+
+def iter_kv_pairs(result):
+    """
+    Lazily convert the located key-value pairs of an Azure result to dicts
+    """
+    for pair in getattr(result, 'key_value_pairs', None) or ():
+        key_content = pair.key.content if pair.key else ""
+        value_content = pair.value.content if pair.value else ""
+        
+        if pair.value and pair.value.bounding_regions:
+            region = pair.value.bounding_regions[0]
+            yield {
+                'confidence': 1.0,
+                'key': {
+                    'content': key_content
+                },
+                'value': {
+                    'content': value_content,
+                    'boundingRegions': [{
+                        'pageNumber': region.page_number,
+                        'polygon': flatten_polygon(region.polygon)
+                    }]
+                }
+            }
+
+def azure_result_to_dict(result):
+    """
+    Convert an Azure result to the analyzeResult JSON layout returned by the API
+    """
+    return {
+        'analyzeResult': {
+            'pages': list(iter_pages(result)),
+            'keyValuePairs': list(iter_kv_pairs(result))
+        }
+    }
 
 def convert_azure_coordinates_to_rect(coordinates, page_width, page_height):
     """
@@ -239,69 +1364,55 @@ def convert_azure_coordinates_to_rect(coordinates, page_width, page_height):
     the top-left corner of the page. PyMuPDF uses points (1 inch = 72 points)
     and measures from the bottom-left corner.
     """
-    points = []
     POINTS_PER_INCH = 72
     
-    # Convert coordinate pairs from inches to points
-    for i in range(0, len(coordinates), 2):
-        if i + 1 < len(coordinates):
-            x = coordinates[i] * POINTS_PER_INCH
-            y = coordinates[i + 1] * POINTS_PER_INCH
-            points.append({'x': x, 'y': y})
+    # Only complete (x, y) pairs count; a trailing unpaired value is ignored
+    pair_count = len(coordinates) // 2
+    if pair_count < 2:
+        return fitz.Rect(0, 0, 0, 0)
     
-    if len(points) >= 2:
-        # Calculate bounding rectangle from all points
-        x_coords = [p['x'] for p in points]
-        y_coords = [p['y'] for p in points]
-        
-        min_x = min(x_coords)
-        max_x = max(x_coords)
-        min_y = min(y_coords)
-        max_y = max(y_coords)
-        
-        return fitz.Rect(min_x, min_y, max_x, max_y)
-    
-    return fitz.Rect(0, 0, 0, 0)
+    # Bounding rectangle from the x and y values, scaled from inches to points
+    x_coords = coordinates[0:pair_count * 2:2]
+    y_coords = coordinates[1:pair_count * 2:2]
+    return fitz.Rect(
+        min(x_coords) * POINTS_PER_INCH,
+        min(y_coords) * POINTS_PER_INCH,
+        max(x_coords) * POINTS_PER_INCH,
+        max(y_coords) * POINTS_PER_INCH
+    )
 
-def find_sensitive_data_from_azure(azure_data, data_types):
+def find_sensitive_data_from_azure(result, data_types):
     """
-    Extract sensitive information from Azure Document Intelligence results.
+    Extract sensitive information from an Azure Document Intelligence result.
+    Reads key-value pairs straight from the SDK objects; polygons are only
+    flattened for pairs that match.
     Supports data types: 'tfn'
     """
     sensitive_data = []
     
-    # Normalize Azure response format to array
-    results_array = []
-    if isinstance(azure_data, list):
-        results_array = azure_data
-    elif 'analyzeResult' in azure_data:
-        results_array = [azure_data]
-    elif isinstance(azure_data, list) and len(azure_data) > 0 and 'analyzeResult' in azure_data[0]:
-        results_array = azure_data
-    else:
-        print("WARNING: Unexpected Azure results format")
-        return sensitive_data
-    
-    # Process each result in the array
-    for result in results_array:
-        key_value_pairs = result.get('analyzeResult', {}).get('keyValuePairs', [])
+    for pair in result.key_value_pairs or []:
+        # Only values with a location on the page can be redacted
+        if not pair.value or not pair.value.bounding_regions:
+            continue
         
-        for pair in key_value_pairs:
-            key_content = pair.get('key', {}).get('content', '').lower()
-            value_content = pair.get('value', {}).get('content', '').strip()
-            
-            # Check for TFN data type only
-            for data_type in data_types:
-                if data_type == 'tfn' and ('tfn' in key_content or 'tax file' in key_content or 'tax number' in key_content or 'tax file number' in key_content):
-                    sensitive_data.append({
-                        'type': 'tfn',
-                        'key': pair.get('key', {}).get('content', ''),
-                        'value': value_content,
-                        'polygon': pair.get('value', {}).get('boundingRegions', [{}])[0].get('polygon', []),
-                        'confidence': pair.get('confidence', 1.0),
-                        'page': pair.get('value', {}).get('boundingRegions', [{}])[0].get('pageNumber', 1) - 1
-                    })
-                    print(f"Found TFN: {pair.get('key', {}).get('content', '')} = {value_content}")
+        key_text = pair.key.content if pair.key else ""
+        key_content = key_text.lower()
+        value_content = pair.value.content.strip()
+        
+        # Match the key against each requested type's keywords in a single regex pass
+        for data_type in data_types:
+            key_pattern = SENSITIVE_KEY_PATTERNS.get(data_type)
+            if key_pattern is not None and key_pattern.search(key_content):
+                region = pair.value.bounding_regions[0]
+                sensitive_data.append({
+                    'type': data_type,
+                    'key': key_text,
+                    'value': value_content,
+                    'polygon': flatten_polygon(region.polygon),
+                    'confidence': 1.0,
+                    'page': region.page_number - 1
+                })
+                logger.debug("Found %s: %s = %s", data_type.upper(), key_text, value_content)
     
     return sensitive_data
 
@@ -310,76 +1421,117 @@ def extract_sensitive_values(sensitive_data):
     Extract the actual sensitive values from the sensitive data objects.
     """
     sensitive_values = []
+    seen_values = set()
     
     for item in sensitive_data:
         value = item.get('value', '').strip()
-        if value and value not in sensitive_values:
+        if value and value not in seen_values:
+            seen_values.add(value)
             sensitive_values.append(value)
-            print(f"Extracted {item['type']} value: {value}")
+            logger.debug("Extracted %s value: %s", item['type'], value)
     
     return sensitive_values
 
-def find_sensitive_values_in_azure_words(azure_data, sensitive_values, data_types):
+def find_sensitive_values_in_azure_words(result, sensitive_values, data_types, page_numbers=None):
     """
-    Search for sensitive values in Azure Document Intelligence words array.
-    Returns word-level coordinates for redaction.
+    Search for sensitive values in the words of an Azure Document Intelligence result.
+    Yields word-level coordinates for redaction as they are found.
+    If page_numbers is given, only those (zero-based) pages are searched.
     """
-    additional_redactions = []
+    logger.debug("Searching Azure words for sensitive values: %s", sensitive_values)
     
-    print(f"Searching Azure words for sensitive values: {sensitive_values}")
+    # Exact matches only, so a set lookup per word replaces scanning every value
+    sensitive_value_set = {value for value in sensitive_values if value}
     
-    # Normalize Azure response format to array
-    results_array = []
-    if isinstance(azure_data, list):
-        results_array = azure_data
-    elif 'analyzeResult' in azure_data:
-        results_array = [azure_data]
-    elif isinstance(azure_data, list) and len(azure_data) > 0 and 'analyzeResult' in azure_data[0]:
-        results_array = azure_data
-    else:
-        print("WARNING: Unexpected Azure results format for word search")
-        return additional_redactions
-    
-    # Process each result in the array
-    for result in results_array:
-        pages = result.get('analyzeResult', {}).get('pages', [])
+    for page_number, page in enumerate(result.pages):
+        if page_numbers is not None and page_number not in page_numbers:
+            continue
         
-        for page in pages:
-            page_number = page.get('pageNumber', 1) - 1  # Convert to zero-based
-            words = page.get('words', [])
-            
-            print(f"Searching page {page_number + 1} with {len(words)} words")
+        words = page.words
+        
+        logger.debug("Searching page %d with %d words", page_number + 1, len(words))
+        
+        # Single Word Exact Matching
+        for word in words:
+            word_content = word.content
             
-            # Single Word Exact Matching
-            for word in words:
-                word_content = word.get('content', '')
-                word_polygon = word.get('polygon', [])
-                word_confidence = word.get('confidence', 1.0)
+            # Only exact match to prevent false positives
+            if word_content in sensitive_value_set:
+                logger.debug("Found sensitive value match: '%s' on page %d", word_content, page_number + 1)
                 
-                # Check if this word matches any of our sensitive values
-                for sensitive_value in sensitive_values:
-                    if not sensitive_value:
+                yield {
+                    'polygon': flatten_polygon(word.polygon),
+                    'page': page_number,
+                    'confidence': 1.0,
+                    'source': 'azure_word_search',
+                    'value': word_content,
+                    'matched_value': word_content
+                }
+        
+        # No pattern matching needed for TFN - handled via key-value pairs only
+
+def is_whole_word_match(rect, words, value):
+    """
+    Check that a page.search_for hit covers whole words that spell the value
+    exactly. search_for matches substrings and ignores case, so without this
+    a TFN of 123456789 would also black out part of "1234567890".
+    words are the entries of page.get_text("words") for the same page.
+    """
+    matched_text = ""
+    for x0, y0, x1, y1, text, *_ in words:
+        overlap = fitz.Rect(x0, y0, x1, y1) & rect
+        # Ignore neighbours that only touch the hit through glyph overhang, and
+        # words on the lines above and below whose boxes clip the hit's height
+        if overlap.is_empty or overlap.width < WORD_MATCH_TOLERANCE or overlap.height < (y1 - y0) / 2:
+            continue
+        # A word sticking out of the hit means the value is only part of it
+        if x0 < rect.x0 - WORD_MATCH_TOLERANCE or x1 > rect.x1 + WORD_MATCH_TOLERANCE:
+            return False
+        matched_text += text
+    
+    # Case-sensitive like the Azure word search; a value wrapped over several
+    # lines produces one hit per line, each spelling part of the value
+    return bool(matched_text) and matched_text in "".join(value.split())
+
+def find_sensitive_values_in_text_layer(pdf_bytes, sensitive_values):
+    """
+    Search for sensitive values in the PDF's own text layer with PyMuPDF, which
+    returns exact rectangles without going through Azure word coordinates.
+    Returns the redactions found and, per (zero-based) page, the values the text
+    layer did not contain. Those still need the Azure word search, since on a
+    mixed page (e.g. a scanned form with a typed header) they may only exist in
+    the image; on a scanned page that is every value.
+    """
+    redactions = []
+    unmatched_values = {}
+    values = [value for value in sensitive_values if value]
+    
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for page_num, page in enumerate(doc):
+            words = page.get_text("words")
+            missing_values = []
+            for value in values:
+                found = False
+                for rect in (page.search_for(value) if words else ()):
+                    if not is_whole_word_match(rect, words, value):
+                        logger.debug("Skipping partial match of '%s' on page %d", value, page_num + 1)
                         continue
-                    
-                    # Only exact match to prevent false positives
-                    if word_content == sensitive_value:
-                        print(f"Found sensitive value match: '{word_content}' matches '{sensitive_value}' on page {page_number + 1}")
-                        
-                        additional_redaction = {
-                            'polygon': word_polygon,
-                            'page': page_number,
-                            'confidence': word_confidence,
-                            'source': 'azure_word_search',
-                            'value': word_content,
-                            'matched_value': sensitive_value
-                        }
-                        
-                        additional_redactions.append(additional_redaction)
-            
-            # No pattern matching needed for TFN - handled via key-value pairs only
+                    found = True
+                    logger.debug("Found sensitive value '%s' in text layer on page %d", value, page_num + 1)
+                    redactions.append({
+                        'rect': [rect.x0, rect.y0, rect.x1, rect.y1],
+                        'page': page_num,
+                        'confidence': 1.0,
+                        'source': 'pymupdf_search',
+                        'value': value,
+                        'matched_value': value
+                    })
+                if not found:
+                    missing_values.append(value)
+            if missing_values:
+                unmatched_values[page_num] = missing_values
     
-    print(f"Found {len(additional_redactions)} additional sensitive value occurrences in Azure words")
-    return additional_redactions
+    return redactions, unmatched_values
 
 def get_patterns_for_data_type(data_type):
     """
@@ -390,75 +1542,133 @@ def get_patterns_for_data_type(data_type):
     # TFN detection is handled via key-value pair matching, no patterns needed
     return patterns
 
-def redact_pdf_secure(pdf_path, redaction_data, output_path):
+def redact_pdf_secure(pdf_bytes, redaction_data):
     """
     Perform secure PDF redaction using PyMuPDF.
+    Returns the redacted PDF as bytes, or None if redaction failed.
     """
     try:
         # Open the PDF document
-        doc = fitz.open(pdf_path)
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
         total_pages = len(doc)
-        print(f"Opened PDF document with {total_pages} pages")
+        logger.debug("Opened PDF document with %d pages", total_pages)
         
-        # Process each redaction area
-        for i, redaction in enumerate(redaction_data):
-            print(f"Processing redaction {i+1} of {len(redaction_data)}")
-            
-            page_num = redaction.get('page', 0)
-            polygon = redaction.get('polygon', [])
-            
+        # Group redaction areas by page so each page is rewritten only once
+        redactions_by_page = defaultdict(list)
+        for redaction in redaction_data:
+            redactions_by_page[redaction.get('page', 0)].append(redaction)
+        
+        for page_num, page_redactions in redactions_by_page.items():
             # Validate page number
             if page_num >= total_pages:
-                print(f"WARNING: Page {page_num} does not exist, skipping redaction")
-                continue
-                
-            # Validate polygon coordinates
-            if len(polygon) < 4:
-                print(f"WARNING: Invalid polygon coordinates (need 4+ values), skipping")
+                logger.warning("Page %d does not exist, skipping %d redactions", page_num, len(page_redactions))
                 continue
             
             # Get the target page
             page = doc[page_num]
             page_rect = page.rect
             
-            # Convert Azure coordinates to PDF rectangle
-            redaction_rect = convert_azure_coordinates_to_rect(
-                polygon, page_rect.width, page_rect.height
-            )
-            
-            # Apply redaction if rectangle is valid
-            if not redaction_rect.is_empty:
-                print(f"Applying redaction to area: {redaction_rect}")
-                
-                # Create redaction annotation
-                redact_annot = page.add_redact_annot(
-                    redaction_rect,
-                    text="[REDACTED]",      # Replacement text to display
-                    fill=(0, 0, 0),         # Black background color
-                    text_color=(1, 1, 1)    # White text color for visibility
-                )
+            annotation_count = 0
+            for redaction in page_redactions:
+                if 'rect' in redaction:
+                    # Text layer matches are already PDF rectangles
+                    redaction_rect = fitz.Rect(redaction['rect'])
+                else:
+                    polygon = redaction.get('polygon', [])
+                    
+                    # Validate polygon coordinates
+                    if len(polygon) < 4:
+                        logger.warning("Invalid polygon coordinates (need 4+ values), skipping")
+                        continue
+                    
+                    # Convert Azure coordinates to PDF rectangle
+                    redaction_rect = convert_azure_coordinates_to_rect(
+                        polygon, page_rect.width, page_rect.height
+                    )
                 
-                # Apply the redaction annotation
+                # Mark the area if rectangle is valid
+                if not redaction_rect.is_empty:
+                    logger.debug("Marking redaction area: %s", redaction_rect)
+                    
+                    # Create redaction annotation
+                    page.add_redact_annot(
+                        redaction_rect,
+                        text="[REDACTED]",      # Replacement text to display
+                        fill=(0, 0, 0),         # Black background color
+                        text_color=(1, 1, 1)    # White text color for visibility
+                    )
+                    annotation_count += 1
+                else:
+                    logger.warning("Empty redaction rectangle, skipping")
+            
+            # Apply all of the page's redaction annotations in one pass
+            if annotation_count:
                 page.apply_redactions()
-                print("Redaction applied successfully")
-            else:
-                print("WARNING: Empty redaction rectangle, skipping")
-        
-        # Save the redacted PDF with optimization
-        doc.save(
-            output_path,
-            garbage=4,          # Remove unused objects
-            deflate=True,       # Compress content streams
-            clean=True          # Clean up document structure
-        )
+                logger.debug("Applied %d redactions on page %d", annotation_count, page_num)
+        
+        # Serialize the redacted PDF. garbage=1 drops the unreferenced objects left
+        # behind by apply_redactions (including the original content streams); the
+        # slower full compaction and structure cleaning are opt-in
+        if REDACTION_PARANOID_SAVE:
+            redacted_pdf = doc.tobytes(
+                garbage=4,          # Remove unused objects and merge duplicates
+                deflate=True,       # Compress content streams
+                clean=True          # Clean up document structure
+            )
+        else:
+            redacted_pdf = doc.tobytes(
+                garbage=1,          # Remove unused objects
+                deflate=True        # Compress content streams
+            )
         doc.close()
         
-        print(f"Redacted PDF saved successfully to: {output_path}")
-        return True
+        logger.info("Redacted PDF generated successfully (%d bytes)", len(redacted_pdf))
+        return redacted_pdf
         
     except Exception as e:
-        print(f"ERROR during PDF redaction: {str(e)}")
-        return False
+        logger.exception("Error during PDF redaction: %s", e)
+        return None
+
+ORJSON_RESPONSE_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def ojsonify(obj, status=200):
+    """
+    Build a JSON response with orjson, which serializes several times faster
+    than the stdlib encoder behind jsonify. numpy arrays are serialized directly.
+    """
+    return Response(
+        orjson.dumps(obj, option=ORJSON_RESPONSE_OPTIONS),
+        status=status,
+        mimetype='application/json'
+    )
+
+def send_renamed_file(file_path, new_filename):
+    """
+    Send a renamed PDF as an attachment named after its generated filename
+    """
+    logger.info("Sending file with download_name: %s.pdf", new_filename)
+    
+    if X_ACCEL_REDIRECT_PREFIX:
+        # nginx streams the file itself; the worker only sends headers
+        response = make_response('')
+        response.headers['X-Accel-Redirect'] = (
+            X_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(os.path.basename(file_path))
+        )
+        response.headers['Content-Type'] = 'application/pdf'
+    else:
+        # Create response with manual Content-Disposition header; conditional
+        # requests and ranges are answered without resending the whole file
+        response = make_response(send_file(
+            file_path,
+            as_attachment=True,
+            mimetype='application/pdf',
+            conditional=True
+        ))
+    
+    # Manually set the Content-Disposition header
+    response.headers['Content-Disposition'] = f'attachment; filename="{new_filename}.pdf"'
+    logger.debug("Response headers: %s", dict(response.headers))
+    return response
 
 @app.route('/rename-document', methods=['POST'])
 def rename_document():
@@ -468,69 +1678,159 @@ def rename_document():
     try:
         # Check if file is present in request
         if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
+            return ojsonify({'error': 'No file provided'}, 400)
         
         file = request.files['file']
         
         # Check if file is selected
         if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+            return ojsonify({'error': 'No file selected'}, 400)
         
-        # Process the file to ensure it's a PDF
+        # Keep the upload in memory; only images touch the disk (for conversion)
         original_filename = secure_filename(file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, f"temp_{uuid.uuid4()}_{original_filename}")
-        file.save(temp_path)
+        file_bytes = file.read()
+        content_hash = compute_content_hash(file_bytes)
+        pdf_bytes = load_pdf_bytes(file_bytes, original_filename)
+
+        # Steps 1-2: Extract text and generate the new filename. Concurrent uploads of
+        # the same file share a single run instead of each calling Azure and OpenAI.
+        new_filename = run_once_per_key(
+            content_hash, generate_filename_for_document,
+            pdf_bytes, content_hash, is_pdf_file(original_filename)
+        )
+
+        if not new_filename:
+            return ojsonify({'error': 'No text could be extracted from the PDF'}, 400)
         
-        try:
-            processed_pdf_path = process_file_to_pdf(temp_path, original_filename)
-            
-            # Step 1: Extract text from PDF using Azure OCR
-            print("Extracting text from PDF...")
-            extracted_text = extract_text_from_pdf(processed_pdf_path)
-            
-            if not extracted_text:
-                return jsonify({'error': 'No text could be extracted from the PDF'}), 400
-            
-            # Step 2: Generate new filename using OpenAI
-            print("Generating new filename with OpenAI...")
-            new_filename = generate_filename_with_openai(extracted_text)
-            
-            # Step 3: Rename the file
-            new_file_path = os.path.join(UPLOAD_FOLDER, f"{new_filename}.pdf")
-            
-            # Handle filename conflicts
-            counter = 1
-            while os.path.exists(new_file_path):
-                new_file_path = os.path.join(UPLOAD_FOLDER, f"{new_filename}_{counter}.pdf")
-                counter += 1
-            
-            # Rename the file
-            shutil.move(processed_pdf_path, new_file_path)
-            
-            # Step 4: Return the renamed file
-            print(f"Sending file with download_name: {new_filename}.pdf")
-            
-            # Create response with manual Content-Disposition header
-            from flask import make_response
-            response = make_response(send_file(
-                new_file_path,
-                as_attachment=True,
-                mimetype='application/pdf'
-            ))
-            
-            # Manually set the Content-Disposition header
-            response.headers['Content-Disposition'] = f'attachment; filename="{new_filename}.pdf"'
-            print(f"Response headers: {dict(response.headers)}")
-            return response
-            
-        except Exception as e:
-            # Clean up temp file if it exists
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise e
+        # Step 3: Write the PDF straight to its final name (suffixed if the name is taken)
+        new_file_path = write_new_file(UPLOAD_FOLDER, new_filename, '.pdf', pdf_bytes)
+        
+        # Step 4: Return the renamed file
+        return send_renamed_file(new_file_path, new_filename)
             
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}, 500)
+
+@app.route('/rename-document/jobs', methods=['POST'])
+def create_rename_job():
+    """
+    Queue a document for renaming and return a job id immediately, so slow
+    OCR and OpenAI calls don't hold the connection open. Poll
+    GET /rename-document/jobs/<job_id> for the result. Documents whose
+    filename is already cached complete without being queued.
+    """
+    try:
+        if 'file' not in request.files:
+            return ojsonify({'error': 'No file provided'}, 400)
+        
+        file = request.files['file']
+        
+        if file.filename == '':
+            return ojsonify({'error': 'No file selected'}, 400)
+        
+        original_filename = secure_filename(file.filename)
+        file_bytes = file.read()
+        content_hash = compute_content_hash(file_bytes)
+        pdf_bytes = load_pdf_bytes(file_bytes, original_filename)
+        check_text_layer = is_pdf_file(original_filename)
+        job_id = uuid.uuid4().hex
+        
+        # Short-circuit when the filename can be resolved without any network calls
+        new_filename = get_cached_document_filename(pdf_bytes, content_hash, check_text_layer)
+        if new_filename:
+            new_file_path = write_new_file(UPLOAD_FOLDER, new_filename, '.pdf', pdf_bytes)
+            write_job_state(job_id, 'completed', filename=new_filename, result_path=new_file_path)
+            return ojsonify({'job_id': job_id, 'status': 'completed', 'filename': f"{new_filename}.pdf"}, 200)
+        
+        write_job_state(job_id, 'queued')
+        rename_job_executor.submit(run_rename_job, job_id, pdf_bytes, content_hash, check_text_layer)
+        return ojsonify({'job_id': job_id, 'status': 'queued'}, 202)
+        
+    except Exception as e:
+        return ojsonify({'error': str(e)}, 500)
+
+@app.route('/rename-document/jobs/<job_id>', methods=['GET'])
+def get_rename_job(job_id):
+    """
+    Poll a rename job. Returns 202 while it is running, the renamed PDF once
+    it has completed, or the error if it failed.
+    """
+    try:
+        job = read_job_state(job_id)
+        if job is None:
+            return ojsonify({'error': 'Job not found'}, 404)
+        
+        if job['status'] == 'completed':
+            return send_renamed_file(job['result_path'], job['filename'])
+        
+        if job['status'] == 'failed':
+            return ojsonify({'job_id': job_id, 'status': 'failed', 'error': job.get('error')}, 500)
+        
+        return ojsonify({'job_id': job_id, 'status': job['status']}, 202)
+        
+    except Exception as e:
+        return ojsonify({'error': str(e)}, 500)
+
+@app.route('/rename-documents', methods=['POST'])
+def rename_documents():
+    """
+    Rename several documents in one request. Text extraction runs concurrently
+    and all filenames are generated with a single OpenAI call. Returns a ZIP
+    archive containing the renamed PDFs.
+    """
+    try:
+        files = request.files.getlist('files')
+        if not files:
+            return ojsonify({'error': 'No files provided'}, 400)
+        
+        if any(file.filename == '' for file in files):
+            return ojsonify({'error': 'No file selected'}, 400)
+        
+        original_filenames = [secure_filename(file.filename) for file in files]
+        unsupported = [name for name in original_filenames if not (is_pdf_file(name) or is_image_file(name))]
+        if unsupported:
+            return ojsonify({'error': f"Unsupported file format: {unsupported}. Supported formats: {', '.join(SUPPORTED_IMAGE_FORMATS | SUPPORTED_PDF_FORMATS)}"}, 400)
+        
+        file_contents = [file.read() for file in files]
+        
+        # Step 1: Extract text from all documents concurrently (each is a network-bound wait).
+        # This uses its own pool because page chunks of long documents are submitted to
+        # ocr_executor, and waiting on that pool from inside it could deadlock.
+        logger.info("Extracting text from %d documents...", len(files))
+        with ThreadPoolExecutor(max_workers=min(AZURE_MAX_CONCURRENCY, len(files))) as executor:
+            documents = list(executor.map(prepare_document_for_rename, file_contents, original_filenames))
+        
+        empty = [name for name, (_, text) in zip(original_filenames, documents) if not text]
+        if empty:
+            return ojsonify({'error': f'No text could be extracted from: {empty}'}, 400)
+        
+        # Step 2: Generate all filenames with one OpenAI call
+        logger.info("Generating new filenames with OpenAI...")
+        new_filenames = generate_filenames_with_openai([text for _, text in documents])
+        
+        # Step 3: Package the renamed PDFs, de-duplicating names within the archive
+        archive = io.BytesIO()
+        used_names = set()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zf:
+            for new_filename, (pdf_bytes, _) in zip(new_filenames, documents):
+                archive_name = f"{new_filename}.pdf"
+                counter = 1
+                while archive_name in used_names:
+                    archive_name = f"{new_filename}_{counter}.pdf"
+                    counter += 1
+                used_names.add(archive_name)
+                zf.writestr(archive_name, pdf_bytes)
+        archive.seek(0)
+        
+        return send_file(
+            archive,
+            as_attachment=True,
+            download_name='renamed_documents.zip',
+            mimetype='application/zip'
+        )
+        
+    except Exception as e:
+        return ojsonify({'error': str(e)}, 500)
 
 @app.route('/redact-document', methods=['POST'])
 def redact_document():
@@ -541,13 +1841,13 @@ def redact_document():
     try:
         # Check if file is present in request
         if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
+            return ojsonify({'error': 'No file provided'}, 400)
         
         file = request.files['file']
         
         # Check if file is selected
         if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+            return ojsonify({'error': 'No file selected'}, 400)
         
         # Get redaction types from request parameters
         redaction_types = request.form.get('redaction_types', 'tfn').split(',')
@@ -557,161 +1857,78 @@ def redact_document():
         valid_types = ['tfn']
         invalid_types = [rt for rt in redaction_types if rt not in valid_types]
         if invalid_types:
-            return jsonify({'error': f'Invalid redaction types: {invalid_types}. Valid types are: {valid_types}'}), 400
+            return ojsonify({'error': f'Invalid redaction types: {invalid_types}. Valid types are: {valid_types}'}, 400)
         
-        # Process the file to ensure it's a PDF
+        # Read the upload once; Azure and PyMuPDF both work from these bytes,
+        # so PDFs never round-trip through a temp file
         original_filename = secure_filename(file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, f"temp_{uuid.uuid4()}_{original_filename}")
-        file.save(temp_path)
+        pdf_bytes = load_pdf_bytes(file.read(), original_filename)
         
-        try:
-            processed_pdf_path = process_file_to_pdf(temp_path, original_filename)
-            
-            # Step 1: Extract text and coordinates from PDF using Azure OCR
-            print(f"Extracting text and coordinates from PDF for redaction types: {redaction_types}...")
-            with open(processed_pdf_path, "rb") as f:
-                poller = document_analysis_client.begin_analyze_document(
-                    "prebuilt-document", document=f
-                )
-            result = poller.result()
-            
-            # Convert Azure result to the format expected by our functions
-            azure_data = {
-                'analyzeResult': {
-                    'pages': [],
-                    'keyValuePairs': []
-                }
-            }
-            
-            # Extract pages and words
-            for page_num, page in enumerate(result.pages):
-                page_data = {
-                    'pageNumber': page_num + 1,
-                    'lines': [],
-                    'words': []
-                }
-                
-                # Extract lines
-                for line in page.lines:
-                    line_data = {
-                        'content': line.content,
-                        'polygon': [
-                            line.polygon[0].x, line.polygon[0].y,
-                            line.polygon[1].x, line.polygon[1].y,
-                            line.polygon[2].x, line.polygon[2].y,
-                            line.polygon[3].x, line.polygon[3].y
-                        ],
-                        'confidence': 1.0
-                    }
-                    page_data['lines'].append(line_data)
-                
-                # Extract words directly from the page
-                for word in page.words:
-                    word_data = {
-                        'content': word.content,
-                        'polygon': [
-                            word.polygon[0].x, word.polygon[0].y,
-                            word.polygon[1].x, word.polygon[1].y,
-                            word.polygon[2].x, word.polygon[2].y,
-                            word.polygon[3].x, word.polygon[3].y
-                        ],
-                        'confidence': 1.0
-                    }
-                    page_data['words'].append(word_data)
-                
-                azure_data['analyzeResult']['pages'].append(page_data)
-            
-            # Extract key-value pairs if available
-            if hasattr(result, 'key_value_pairs'):
-                for pair in result.key_value_pairs:
-                    key_content = pair.key.content if pair.key else ""
-                    value_content = pair.value.content if pair.value else ""
-                    
-                    if pair.value and pair.value.bounding_regions:
-                        kv_pair = {
-                            'confidence': 1.0,
-                            'key': {
-                                'content': key_content
-                            },
-                            'value': {
-                                'content': value_content,
-                                'boundingRegions': [{
-                                    'pageNumber': pair.value.bounding_regions[0].page_number,
-                                    'polygon': [
-                                        pair.value.bounding_regions[0].polygon[0].x,
-                                        pair.value.bounding_regions[0].polygon[0].y,
-                                        pair.value.bounding_regions[0].polygon[1].x,
-                                        pair.value.bounding_regions[0].polygon[1].y,
-                                        pair.value.bounding_regions[0].polygon[2].x,
-                                        pair.value.bounding_regions[0].polygon[2].y,
-                                        pair.value.bounding_regions[0].polygon[3].x,
-                                        pair.value.bounding_regions[0].polygon[3].y
-                                    ]
-                                }]
-                            }
-                        }
-                        azure_data['analyzeResult']['keyValuePairs'].append(kv_pair)
-            
-            # Step 2: Find sensitive information from Azure results
-            print(f"Finding sensitive data of types: {redaction_types}...")
-            sensitive_data = find_sensitive_data_from_azure(azure_data, redaction_types)
-            
-            if not sensitive_data:
-                return jsonify({'message': f'No sensitive data of types {redaction_types} found in the document', 'redacted_file': None}), 200
-            
-            print(f"Found {len(sensitive_data)} sensitive data fields to redact")
-            
-            # Step 3: Extract sensitive values and search for additional occurrences
-            sensitive_values = extract_sensitive_values(sensitive_data)
-            additional_redactions = find_sensitive_values_in_azure_words(azure_data, sensitive_values, redaction_types)
-            
-            # Step 4: Combine key-value pair coordinates and word-level coordinates for redaction
-            all_redactions = []
-            
-            # Add key-value pair coordinates
-            for sensitive_item in sensitive_data:
-                polygon = sensitive_item.get('polygon', [])
-                if polygon:  # Only add if polygon exists
-                    all_redactions.append({
-                        'polygon': polygon,
-                        'page': sensitive_item.get('page', 0),
-                        'confidence': sensitive_item.get('confidence', 1.0),
-                        'source': 'azure_key_value_pair',
-                        'value': sensitive_item.get('value', ''),
-                        'matched_value': sensitive_item.get('value', '')
-                    })
-            
-            # Add word-level coordinates
-            all_redactions.extend(additional_redactions)
-            
-            print(f"Total redactions to apply: {len(all_redactions)} ({len(sensitive_data)} from key-value pairs, {len(additional_redactions)} from word matching)")
-            
-            if not all_redactions:
-                return jsonify({'message': f'No sensitive data of types {redaction_types} found in document words', 'redacted_file': None}), 200
-            
-            # Step 5: Perform secure redaction
-            redacted_pdf_path = processed_pdf_path.replace('.pdf', '_redacted.pdf')
-            redaction_success = redact_pdf_secure(processed_pdf_path, all_redactions, redacted_pdf_path)
-            
-            if redaction_success:
-                # Step 6: Return the redacted file
-                return send_file(
-                    redacted_pdf_path,
-                    as_attachment=True,
-                    download_name=f"redacted_{original_filename.rsplit('.', 1)[0]}.pdf",
-                    mimetype='application/pdf'
-                )
-            else:
-                return jsonify({'error': 'Redaction process failed'}), 500
-            
-        except Exception as e:
-            # Clean up temp file if it exists
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise e
+        # Step 1: Extract text and coordinates from PDF using Azure OCR
+        logger.info("Extracting text and coordinates from PDF for redaction types: %s...", redaction_types)
+        result = analyze_pdf(pdf_bytes)
+        
+        # Step 2: Find sensitive information from Azure results
+        logger.info("Finding sensitive data of types: %s...", redaction_types)
+        sensitive_data = find_sensitive_data_from_azure(result, redaction_types)
+        
+        if not sensitive_data:
+            return ojsonify({'message': f'No sensitive data of types {redaction_types} found in the document', 'redacted_file': None}, 200)
+        
+        logger.info("Found %d sensitive data fields to redact", len(sensitive_data))
+        
+        # Step 3: Extract sensitive values and search for additional occurrences
+        sensitive_values = extract_sensitive_values(sensitive_data)
+        
+        # Step 4: Combine key-value pair coordinates and word-level coordinates for redaction
+        all_redactions = []
+        
+        # Add key-value pair coordinates
+        for sensitive_item in sensitive_data:
+            polygon = sensitive_item.get('polygon', [])
+            if polygon:  # Only add if polygon exists
+                all_redactions.append({
+                    'polygon': polygon,
+                    'page': sensitive_item.get('page', 0),
+                    'confidence': sensitive_item.get('confidence', 1.0),
+                    'source': 'azure_key_value_pair',
+                    'value': sensitive_item.get('value', ''),
+                    'matched_value': sensitive_item.get('value', '')
+                })
+        
+        # Add word-level coordinates: the text layer is searched directly with
+        # PyMuPDF, and any value it doesn't contain on a page falls back to the
+        # Azure word search for that page
+        key_value_count = len(all_redactions)
+        text_layer_redactions, unmatched_values = find_sensitive_values_in_text_layer(pdf_bytes, sensitive_values)
+        all_redactions.extend(text_layer_redactions)
+        for page_num, page_values in unmatched_values.items():
+            all_redactions.extend(find_sensitive_values_in_azure_words(
+                result, page_values, redaction_types, page_numbers={page_num}
+            ))
+        
+        logger.info("Total redactions to apply: %d (%d from key-value pairs, %d from word matching)",
+                    len(all_redactions), key_value_count, len(all_redactions) - key_value_count)
+        
+        if not all_redactions:
+            return ojsonify({'message': f'No sensitive data of types {redaction_types} found in document words', 'redacted_file': None}, 200)
+        
+        # Step 5: Perform secure redaction
+        redacted_pdf = redact_pdf_secure(pdf_bytes, all_redactions)
+        
+        if redacted_pdf is not None:
+            # Step 6: Return the redacted file
+            return send_file(
+                io.BytesIO(redacted_pdf),
+                as_attachment=True,
+                download_name=f"redacted_{original_filename.rsplit('.', 1)[0]}.pdf",
+                mimetype='application/pdf'
+            )
+        else:
+            return ojsonify({'error': 'Redaction process failed'}, 500)
             
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}, 500)
 
 @app.route('/extract-ocr', methods=['POST'])
 def extract_ocr():
@@ -721,123 +1938,38 @@ def extract_ocr():
     try:
         # Check if file is present in request
         if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
+            return ojsonify({'error': 'No file provided'}, 400)
         
         file = request.files['file']
         
         # Check if file is selected
         if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+            return ojsonify({'error': 'No file selected'}, 400)
         
-        # Process the file to ensure it's a PDF
+        # Read the upload once and hand the bytes straight to Azure
         original_filename = secure_filename(file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, f"temp_{uuid.uuid4()}_{original_filename}")
-        file.save(temp_path)
+        pdf_bytes = load_pdf_bytes(file.read(), original_filename)
         
-        try:
-            processed_pdf_path = process_file_to_pdf(temp_path, original_filename)
-            
-            # Extract text and coordinates from PDF using Azure OCR
-            print("Extracting OCR data from PDF...")
-            with open(processed_pdf_path, "rb") as f:
-                poller = document_analysis_client.begin_analyze_document(
-                    "prebuilt-document", document=f
-                )
-            result = poller.result()
-            
-            # Convert Azure result to JSON format
-            ocr_data = {
-                'analyzeResult': {
-                    'pages': [],
-                    'keyValuePairs': []
-                }
-            }
-            
-            # Extract pages, lines, and words
-            for page_num, page in enumerate(result.pages):
-                page_data = {
-                    'pageNumber': page_num + 1,
-                    'lines': [],
-                    'words': []
-                }
-                
-                # Extract lines
-                for line in page.lines:
-                    line_data = {
-                        'content': line.content,
-                        'polygon': [
-                            line.polygon[0].x, line.polygon[0].y,
-                            line.polygon[1].x, line.polygon[1].y,
-                            line.polygon[2].x, line.polygon[2].y,
-                            line.polygon[3].x, line.polygon[3].y
-                        ],
-                        'confidence': 1.0
-                    }
-                    page_data['lines'].append(line_data)
-                
-                # Extract words directly from the page
-                for word in page.words:
-                    word_data = {
-                        'content': word.content,
-                        'polygon': [
-                            word.polygon[0].x, word.polygon[0].y,
-                            word.polygon[1].x, word.polygon[1].y,
-                            word.polygon[2].x, word.polygon[2].y,
-                            word.polygon[3].x, word.polygon[3].y
-                        ],
-                        'confidence': 1.0
-                    }
-                    page_data['words'].append(word_data)
-                
-                ocr_data['analyzeResult']['pages'].append(page_data)
-            
-            # Extract key-value pairs if available
-            if hasattr(result, 'key_value_pairs'):
-                for pair in result.key_value_pairs:
-                    key_content = pair.key.content if pair.key else ""
-                    value_content = pair.value.content if pair.value else ""
-                    
-                    if pair.value and pair.value.bounding_regions:
-                        kv_pair = {
-                            'confidence': 1.0,
-                            'key': {
-                                'content': key_content
-                            },
-                            'value': {
-                                'content': value_content,
-                                'boundingRegions': [{
-                                    'pageNumber': pair.value.bounding_regions[0].page_number,
-                                    'polygon': [
-                                        pair.value.bounding_regions[0].polygon[0].x,
-                                        pair.value.bounding_regions[0].polygon[0].y,
-                                        pair.value.bounding_regions[0].polygon[1].x,
-                                        pair.value.bounding_regions[0].polygon[1].y,
-                                        pair.value.bounding_regions[0].polygon[2].x,
-                                        pair.value.bounding_regions[0].polygon[2].y,
-                                        pair.value.bounding_regions[0].polygon[3].x,
-                                        pair.value.bounding_regions[0].polygon[3].y
-                                    ]
-                                }]
-                            }
-                        }
-                        ocr_data['analyzeResult']['keyValuePairs'].append(kv_pair)
-            
-            # Clean up temp files
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            if processed_pdf_path != temp_path and os.path.exists(processed_pdf_path):
-                os.remove(processed_pdf_path)
-            
-            return jsonify(ocr_data)
-            
-        except Exception as e:
-            # Clean up temp file if it exists
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise e
+        # Identical uploads get the serialized response from the last time,
+        # skipping the analysis cache reads, chunk merge and conversion
+        cache_key = f"{ANALYSIS_MODEL_ID}-{compute_content_hash(pdf_bytes)}"
+        cached = read_cache('ocr_json', cache_key)
+        if cached is not None:
+            logger.info("Using cached OCR data for %s", cache_key)
+            return Response(cached, mimetype='application/json')
+        
+        # Extract text and coordinates from PDF using Azure OCR
+        logger.info("Extracting OCR data from PDF...")
+        result = analyze_pdf(pdf_bytes)
+        
+        # Convert Azure result to JSON format
+        ocr_json = orjson.dumps(azure_result_to_dict(result), option=ORJSON_RESPONSE_OPTIONS)
+        write_cache('ocr_json', cache_key, ocr_json.decode('utf-8'))
+        
+        return Response(ocr_json, mimetype='application/json')
             
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}, 500)
 
 @app.route('/debug-tfn-coordinates', methods=['POST'])
 def debug_sensitive_coordinates():
@@ -848,180 +1980,104 @@ def debug_sensitive_coordinates():
     try:
         # Check if file is present in request
         if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
+            return ojsonify({'error': 'No file provided'}, 400)
         
         file = request.files['file']
         
         # Check if file is selected
         if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+            return ojsonify({'error': 'No file selected'}, 400)
+        
+        # Get redaction types from request parameters (default to 'tfn' for backward compatibility)
+        redaction_types = request.form.get('redaction_types', 'tfn').split(',')
+        redaction_types = [rt.strip().lower() for rt in redaction_types if rt.strip()]
+        
+        # Validate redaction types before any blocking disk or PDF work ties up the worker thread
+        valid_types = ['tfn']
+        invalid_types = [rt for rt in redaction_types if rt not in valid_types]
+        if invalid_types:
+            return ojsonify({'error': f'Invalid redaction types: {invalid_types}. Valid types are: {valid_types}'}, 400)
         
-        # Process the file to ensure it's a PDF
+        # Read the upload once and hand the bytes straight to Azure
         original_filename = secure_filename(file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, f"temp_{uuid.uuid4()}_{original_filename}")
-        file.save(temp_path)
+        pdf_bytes = load_pdf_bytes(file.read(), original_filename)
         
-        try:
-            processed_pdf_path = process_file_to_pdf(temp_path, original_filename)
-            
-            # Get redaction types from request parameters (default to 'tfn' for backward compatibility)
-            redaction_types = request.form.get('redaction_types', 'tfn').split(',')
-            redaction_types = [rt.strip().lower() for rt in redaction_types if rt.strip()]
-            
-            # Validate redaction types
-            valid_types = ['tfn']
-            invalid_types = [rt for rt in redaction_types if rt not in valid_types]
-            if invalid_types:
-                return jsonify({'error': f'Invalid redaction types: {invalid_types}. Valid types are: {valid_types}'}), 400
-            
-            # Extract text and coordinates from PDF using Azure OCR
-            print(f"Extracting OCR data for sensitive coordinate debugging (types: {redaction_types})...")
-            with open(processed_pdf_path, "rb") as f:
-                poller = document_analysis_client.begin_analyze_document(
-                    "prebuilt-document", 
-                    document=f
-                )
-            result = poller.result()
-            
-            # Debug: Check how many pages Azure returned
-            print(f"Azure OCR returned {len(result.pages)} pages")
-            
-            # Also check if there are any other page-related attributes
-            if hasattr(result, 'pages'):
-                print(f"Total pages in result: {len(result.pages)}")
-                for i, page in enumerate(result.pages):
-                    print(f"  Page {i+1}: {len(page.words)} words, {len(page.lines)} lines")
-            
-            # Convert Azure result to the format expected by our functions
-            azure_data = {
-                'analyzeResult': {
-                    'pages': [],
-                    'keyValuePairs': []
-                }
-            }
-            
-            # Extract pages and words
-            for page_num, page in enumerate(result.pages):
-                print(f"Processing page {page_num + 1} with {len(page.words)} words")
-                page_data = {
-                    'pageNumber': page_num + 1,
-                    'words': []
-                }
-                
-                # Extract words directly from the page
-                for word in page.words:
-                    word_data = {
-                        'content': word.content,
-                        'polygon': [
-                            word.polygon[0].x, word.polygon[0].y,
-                            word.polygon[1].x, word.polygon[1].y,
-                            word.polygon[2].x, word.polygon[2].y,
-                            word.polygon[3].x, word.polygon[3].y
-                        ],
-                        'confidence': 1.0
-                    }
-                    page_data['words'].append(word_data)
-                
-                azure_data['analyzeResult']['pages'].append(page_data)
-            
-            # Extract key-value pairs if available
-            if hasattr(result, 'key_value_pairs'):
-                print(f"Found {len(result.key_value_pairs)} key-value pairs")
-                for pair in result.key_value_pairs:
-                    key_content = pair.key.content if pair.key else ""
-                    value_content = pair.value.content if pair.value else ""
-                    
-                    if pair.value and pair.value.bounding_regions:
-                        kv_pair = {
-                            'confidence': 1.0,
-                            'key': {
-                                'content': key_content
-                            },
-                            'value': {
-                                'content': value_content,
-                                'boundingRegions': [{
-                                    'pageNumber': pair.value.bounding_regions[0].page_number,
-                                    'polygon': [
-                                        pair.value.bounding_regions[0].polygon[0].x,
-                                        pair.value.bounding_regions[0].polygon[0].y,
-                                        pair.value.bounding_regions[0].polygon[1].x,
-                                        pair.value.bounding_regions[0].polygon[1].y,
-                                        pair.value.bounding_regions[0].polygon[2].x,
-                                        pair.value.bounding_regions[0].polygon[2].y,
-                                        pair.value.bounding_regions[0].polygon[3].x,
-                                        pair.value.bounding_regions[0].polygon[3].y
-                                    ]
-                                }]
-                            }
-                        }
-                        azure_data['analyzeResult']['keyValuePairs'].append(kv_pair)
-            
-            # Find sensitive information from Azure results
-            print(f"Finding sensitive data of types {redaction_types} for debugging...")
-            sensitive_data = find_sensitive_data_from_azure(azure_data, redaction_types)
-            
-            if not sensitive_data:
-                return jsonify({
-                    'message': f'No sensitive data of types {redaction_types} found in the document',
-                    'sensitive_data': [],
-                    'sensitive_values': [],
-                    'word_coordinates': [],
-                    'azure_data_structure': {
-                        'total_pages': len(azure_data['analyzeResult']['pages']),
-                        'total_words': sum(len(page['words']) for page in azure_data['analyzeResult']['pages']),
-                        'total_key_value_pairs': len(azure_data['analyzeResult']['keyValuePairs'])
-                    }
-                }), 200
-            
-            print(f"Found {len(sensitive_data)} sensitive data fields")
-            
-            # Extract sensitive values and search for additional occurrences
-            sensitive_values = extract_sensitive_values(sensitive_data)
-            additional_redactions = find_sensitive_values_in_azure_words(azure_data, sensitive_values, redaction_types)
-            
-            # Prepare debug response
-            debug_response = {
-                'sensitive_data_found': sensitive_data,
-                'sensitive_values_extracted': sensitive_values,
-                'word_coordinates_found': additional_redactions,
-                'total_redactions': len(additional_redactions),
-                'redaction_types_requested': redaction_types,
+        # Extract text and coordinates from PDF using Azure OCR
+        logger.debug("Extracting OCR data for sensitive coordinate debugging (types: %s)", redaction_types)
+        result = analyze_pdf(pdf_bytes)
+        
+        # Word counts per page, shared by the log and both response shapes
+        word_counts = [len(page.words) for page in result.pages]
+        total_words = sum(word_counts)
+        
+        # Debug: Check how many pages Azure returned, with per-page counts
+        # only walked when DEBUG logging is actually enabled
+        logger.debug("Azure OCR returned %d pages with %d words", len(result.pages), total_words)
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, page in enumerate(result.pages):
+                logger.debug("  Page %d: %d words, %d lines", i + 1, word_counts[i], len(page.lines))
+        
+        # Extract key-value pairs if available
+        key_value_pairs = getattr(result, 'key_value_pairs', None) or ()
+        logger.debug("Found %d key-value pairs", len(key_value_pairs))
+        
+        # Only pairs with a located value are reported, as in the OCR JSON layout
+        located_pair_count = sum(1 for pair in key_value_pairs if pair.value and pair.value.bounding_regions)
+        
+        # Find sensitive information from Azure results
+        logger.debug("Finding sensitive data of types %s for debugging", redaction_types)
+        sensitive_data = find_sensitive_data_from_azure(result, redaction_types)
+        
+        if not sensitive_data:
+            return ojsonify({
+                'message': f'No sensitive data of types {redaction_types} found in the document',
+                'sensitive_data': [],
+                'sensitive_values': [],
+                'word_coordinates': [],
                 'azure_data_structure': {
-                    'total_pages': len(azure_data['analyzeResult']['pages']),
-                    'total_words': sum(len(page['words']) for page in azure_data['analyzeResult']['pages']),
-                    'total_key_value_pairs': len(azure_data['analyzeResult']['keyValuePairs']),
-                    'pages_detail': [
-                        {
-                            'page_number': page['pageNumber'],
-                            'word_count': len(page['words'])
-                        } for page in azure_data['analyzeResult']['pages']
-                    ]
+                    'total_pages': len(result.pages),
+                    'total_words': total_words,
+                    'total_key_value_pairs': located_pair_count
                 }
+            }, 200)
+        
+        logger.debug("Found %d sensitive data fields", len(sensitive_data))
+        
+        # Extract sensitive values and search for additional occurrences
+        sensitive_values = extract_sensitive_values(sensitive_data)
+        additional_redactions = list(find_sensitive_values_in_azure_words(result, sensitive_values, redaction_types))
+        
+        # Prepare debug response
+        debug_response = {
+            'sensitive_data_found': sensitive_data,
+            'sensitive_values_extracted': sensitive_values,
+            'word_coordinates_found': additional_redactions,
+            'total_redactions': len(additional_redactions),
+            'redaction_types_requested': redaction_types,
+            'azure_data_structure': {
+                'total_pages': len(result.pages),
+                'total_words': total_words,
+                'total_key_value_pairs': located_pair_count,
+                'pages_detail': [
+                    {
+                        'page_number': page_num + 1,
+                        'word_count': word_count
+                    } for page_num, word_count in enumerate(word_counts)
+                ]
             }
-            
-            # Clean up temp files
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            if processed_pdf_path != temp_path and os.path.exists(processed_pdf_path):
-                os.remove(processed_pdf_path)
-            
-            return jsonify(debug_response)
-            
-        except Exception as e:
-            # Clean up temp file if it exists
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise e
-            
+        }
+        
+        return ojsonify(debug_response)
+        
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}, 500)
 
-def convert_pdf_to_image(pdf_path, page_number=0, image_format='PNG', quality=2.0):
+def convert_pdf_to_image(pdf_bytes, page_number=0, image_format='PNG', quality=2.0):
     """
     Convert PDF page to image.
     
     Args:
-        pdf_path: Path to PDF file
+        pdf_bytes: PDF file contents
         page_number: Page number to convert (0-based)
         image_format: Output image format (PNG, JPEG, etc.)
         quality: Scale factor for image quality (1.0 = 72 DPI, 2.0 = 144 DPI)
@@ -1030,7 +2086,7 @@ def convert_pdf_to_image(pdf_path, page_number=0, image_format='PNG', quality=2.
         Dict with image data and metadata
     """
     try:
-        doc = fitz.open(pdf_path)
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
         
         if page_number >= len(doc):
             raise Exception(f"Page {page_number} does not exist. PDF has {len(doc)} pages.")
@@ -1038,13 +2094,25 @@ def convert_pdf_to_image(pdf_path, page_number=0, image_format='PNG', quality=2.
         page = doc[page_number]
         page_rect = page.rect
         
-        # Render page as image with specified quality
+        # Render page as image with specified quality, as opaque RGB so the pixmap
+        # samples feed the JPEG encoder directly and PNGs carry no alpha channel
         mat = fitz.Matrix(quality, quality)
-        pix = page.get_pixmap(matrix=mat)
+        pix = page.get_pixmap(matrix=mat, alpha=False)
+        
+        # Halve oversized renders (large page sizes at high quality) until they fit
+        scale = quality
+        while max(pix.width, pix.height) > SIGNATURE_IMAGE_MAX_DIMENSION:
+            pix.shrink(1)
+            scale /= 2
         
         # Convert to specified format
         if image_format.upper() == 'JPEG':
-            img_data = pix.tobytes("jpeg")
+            # Encode straight from the pixmap's sample buffer with Pillow, whose
+            # libjpeg-turbo build is quicker than MuPDF's bundled encoder
+            image = Image.frombuffer("RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1)
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=SIGNATURE_JPEG_QUALITY)
+            img_data = buffer.getvalue()
             content_type = "image/jpeg"
         else:  # Default to PNG
             img_data = pix.tobytes("png")
@@ -1065,7 +2133,7 @@ def convert_pdf_to_image(pdf_path, page_number=0, image_format='PNG', quality=2.
                 'height': float(page_rect.height)
             },
             'quality_scale': quality,
-            'dpi': int(72 * quality),
+            'dpi': int(72 * scale),
             'content_type': content_type,
             'image_data': img_data
         }
@@ -1088,6 +2156,16 @@ def detect_signature_with_openai(image_data, image_format='PNG'):
         Dict with signature detection results and confidence
     """
     try:
+        # A resubmitted page renders to the same image, so reuse the earlier
+        # answer instead of base64-encoding and sending it to OpenAI again
+        image_digest = hashlib.blake2b(image_data, digest_size=16).hexdigest()
+        with signature_cache_lock:
+            cached_result = signature_result_cache.get(image_digest)
+            if cached_result is not None:
+                signature_result_cache.move_to_end(image_digest)
+                logger.info("Using cached signature detection for %s", image_digest)
+                return dict(cached_result)
+        
         # Encode image to base64
         base64_image = base64.b64encode(image_data).decode('utf-8')
         
@@ -1120,7 +2198,7 @@ def detect_signature_with_openai(image_data, image_format='PNG'):
         """
         
         # Call OpenAI Vision API
-        response = openai_client.chat.completions.create(
+        response = create_chat_completion(
             model="gpt-4o",
             messages=[
                 {
@@ -1145,15 +2223,11 @@ def detect_signature_with_openai(image_data, image_format='PNG'):
         response_text = response.choices[0].message.content.strip()
         
         # Clean up markdown code blocks if present
-        if response_text.startswith('```json'):
-            response_text = response_text.replace('```json', '').replace('```', '').strip()
-        elif response_text.startswith('```'):
-            response_text = response_text.replace('```', '').strip()
+        response_text = SIGNATURE_RESPONSE_FENCE.sub('', response_text)
         
         # Try to parse JSON response
         try:
-            import json
-            result = json.loads(response_text)
+            result = orjson.loads(response_text)
             
             # Validate required fields
             required_fields = ['is_signed', 'confidence', 'signature_description', 'signature_location']
@@ -1166,11 +2240,16 @@ def detect_signature_with_openai(image_data, image_format='PNG'):
             # Ensure is_signed is boolean
             result['is_signed'] = bool(result['is_signed'])
             
+            with signature_cache_lock:
+                signature_result_cache[image_digest] = dict(result)
+                if len(signature_result_cache) > SIGNATURE_CACHE_SIZE:
+                    signature_result_cache.popitem(last=False)
+            
             return result
             
-        except (json.JSONDecodeError, ValueError, KeyError) as e:
-            print(f"Error parsing OpenAI response: {e}")
-            print(f"Raw response: {response_text}")
+        except (orjson.JSONDecodeError, ValueError, KeyError) as e:
+            logger.warning("Error parsing OpenAI response: %s", e)
+            logger.debug("Raw response: %s", response_text)
             
             # Fallback: try to determine from response text
             response_lower = response_text.lower()
@@ -1195,98 +2274,85 @@ def detect_signature_ai_endpoint():
     Parameters:
     - file: PDF file to analyze (required)
     - page_number: Page number to analyze (optional, defaults to 0)
-    - image_format: Format for AI analysis PNG or JPEG (optional, defaults to PNG)
-    - quality: Image quality for AI analysis 1.0-4.0 (optional, defaults to 2.0)
+    - image_format: Format for AI analysis PNG or JPEG (optional, defaults to JPEG)
+    - quality: Image quality for AI analysis 1.0-4.0 (optional, defaults to 1.5)
     """
     try:
         # Check if file is present in request
         if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
+            return ojsonify({'error': 'No file provided'}, 400)
         
         file = request.files['file']
         
         # Check if file is selected
         if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+            return ojsonify({'error': 'No file selected'}, 400)
         
         # Get optional parameters
         page_number = int(request.form.get('page_number', 0))
-        image_format = request.form.get('image_format', 'PNG').upper()
-        quality = float(request.form.get('quality', 2.0))
+        image_format = request.form.get('image_format', SIGNATURE_IMAGE_FORMAT).upper()
+        quality = float(request.form.get('quality', SIGNATURE_IMAGE_QUALITY))
         
         # Validate parameters
         if image_format not in ['PNG', 'JPEG']:
-            return jsonify({'error': 'Invalid image_format. Must be PNG or JPEG'}), 400
+            return ojsonify({'error': 'Invalid image_format. Must be PNG or JPEG'}, 400)
         
         if not (1.0 <= quality <= 4.0):
-            return jsonify({'error': 'Invalid quality. Must be between 1.0 and 4.0'}), 400
+            return ojsonify({'error': 'Invalid quality. Must be between 1.0 and 4.0'}, 400)
         
-        # Process the file to ensure it's a PDF
+        # Read the upload once; PDFs are rendered straight from memory
         original_filename = secure_filename(file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, f"temp_{uuid.uuid4()}_{original_filename}")
-        file.save(temp_path)
+        pdf_bytes = load_pdf_bytes(file.read(), original_filename)
         
-        try:
-            processed_pdf_path = process_file_to_pdf(temp_path, original_filename)
-            
-            # Convert PDF to image
-            print(f"Converting PDF page {page_number + 1} to image for AI analysis...")
-            conversion_result = convert_pdf_to_image(processed_pdf_path, page_number, image_format, quality)
-            
-            # Extract image data
-            image_data = conversion_result['image_data']
-            
-            # Use OpenAI to detect signature
-            print("Analyzing image with OpenAI for signature detection...")
-            ai_result = detect_signature_with_openai(image_data, image_format)
-            
-            # Clean up temp files
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            if processed_pdf_path != temp_path and os.path.exists(processed_pdf_path):
-                os.remove(processed_pdf_path)
-            
-            # Prepare response
-            response_data = {
-                'success': True,
-                'filename': original_filename,
-                'page_analyzed': page_number + 1,
-                'total_pages': conversion_result['total_pages'],
-                'is_signed': ai_result['is_signed'],  # Main boolean result
-                'signature_detection': {
-                    'confidence': ai_result['confidence'],
-                    'description': ai_result['signature_description'],
-                    'location': ai_result['signature_location']
-                },
-                'analysis_details': {
-                    'image_format_used': conversion_result['image_format'],
-                    'image_dimensions': conversion_result['image_dimensions'],
-                    'quality_scale': conversion_result['quality_scale'],
-                    'dpi': conversion_result['dpi'],
-                    'ai_model': 'gpt-4o'
-                }
+        # Convert PDF to image
+        logger.info("Converting PDF page %d to image for AI analysis...", page_number + 1)
+        conversion_result = convert_pdf_to_image(pdf_bytes, page_number, image_format, quality)
+        
+        # Extract image data
+        image_data = conversion_result['image_data']
+        
+        # Use OpenAI to detect signature
+        logger.info("Analyzing image with OpenAI for signature detection...")
+        ai_result = detect_signature_with_openai(image_data, image_format)
+        
+        # Prepare response
+        response_data = {
+            'success': True,
+            'filename': original_filename,
+            'page_analyzed': page_number + 1,
+            'total_pages': conversion_result['total_pages'],
+            'is_signed': ai_result['is_signed'],  # Main boolean result
+            'signature_detection': {
+                'confidence': ai_result['confidence'],
+                'description': ai_result['signature_description'],
+                'location': ai_result['signature_location']
+            },
+            'analysis_details': {
+                'image_format_used': conversion_result['image_format'],
+                'image_dimensions': conversion_result['image_dimensions'],
+                'quality_scale': conversion_result['quality_scale'],
+                'dpi': conversion_result['dpi'],
+                'ai_model': 'gpt-4o'
             }
-            
-            return jsonify(response_data)
-            
-        except Exception as e:
-            # Clean up temp file if it exists
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise e
-            
+        }
+        
+        return ojsonify(response_data)
+        
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}, 500)
 
 @app.route('/', methods=['GET'])
 def index():
     """
     API information endpoint
     """
-    return jsonify({
+    return ojsonify({
         'message': 'Document Processing API',
         'endpoints': {
             'POST /rename-document': 'Upload a PDF or image file to get it renamed based on content',
+            'POST /rename-document/jobs': 'Upload a PDF or image file to rename in the background (returns a job id)',
+            'GET /rename-document/jobs/<job_id>': 'Poll a background rename job; returns the renamed file once complete',
+            'POST /rename-documents': 'Upload several PDF or image files to get them renamed in one batch (returns a ZIP)',
             'POST /redact-document': 'Upload a PDF or image file to redact TFN information',
             'POST /extract-ocr': 'Upload a PDF or image file to get Azure OCR JSON data',
             'POST /pdf-to-image': 'Convert PDF pages to image files (PNG or JPEG) with customizable quality',
@@ -1294,6 +2360,8 @@ def index():
         },
         'usage': {
             'rename': 'Send a POST request to /rename-document with a PDF or image file in the "file" field',
+            'rename_job': 'Send a POST request to /rename-document/jobs with a PDF or image file in the "file" field, then poll GET /rename-document/jobs/<job_id> until it returns the file',
+            'rename_batch': 'Send a POST request to /rename-documents with one or more PDF or image files in the "files" field',
             'redact': 'Send a POST request to /redact-document with a PDF or image file in the "file" field (only TFN redaction supported)',
             'ocr': 'Send a POST request to /extract-ocr with a PDF or image file in the "file" field',
             'pdf_to_image': 'Send a POST request to /pdf-to-image with a PDF file and optional parameters (page_number, image_format, quality, return_type)',
@@ -1320,8 +2388,10 @@ def index():
 if __name__ == '__main__':
     # Check if required environment variables are set
     if not AZURE_ENDPOINT or not AZURE_KEY:
-        print("Warning: Azure Form Recognizer credentials not found in environment variables")
+        logger.warning("Azure Form Recognizer credentials not found in environment variables")
     if not OPENAI_API_KEY:
-        print("Warning: OpenAI API key not found in environment variables")
+        logger.warning("OpenAI API key not found in environment variables")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Debug mode (reloader, pretty-printed JSON, interactive tracebacks) is opt-in
+    debug = os.getenv('FLASK_DEBUG', '').lower() in ('1', 'true', 'yes')
+    app.run(debug=debug, host='0.0.0.0', port=5000)
@@ -0,0 +1,27 @@
+"""
+Gunicorn configuration for serving the Document Processing API.
+
+The endpoints spend nearly all of their time waiting on Azure Form Recognizer
+and OpenAI, so threaded workers let each process overlap many in-flight
+requests while the GIL is released during network I/O.
+
+Usage:
+    gunicorn app:app
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', '16'))
+
+# Azure OCR on large documents can take well over the default 30 seconds
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '180'))
+
+# Serve file responses with sendfile(2) so PDFs go from the page cache to the
+# socket without a userspace copy. Disable (GUNICORN_SENDFILE=0) when uploads
+# live on a slow network filesystem, where blocking in the kernel hurts workers.
+sendfile = os.getenv('GUNICORN_SENDFILE', '1').lower() in ('1', 'true', 'yes')
+keepalive = 5
@@ -0,0 +1,92 @@
+"""
+Unit tests for the PyMuPDF text-layer search used by /redact-document
+"""
+
+import os
+
+import fitz
+
+# app.py builds its Azure and OpenAI clients at import time
+os.environ.setdefault('AZURE_ENDPOINT', 'https://example.invalid/')
+os.environ.setdefault('AZURE_KEY', 'test-key')
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from app import find_sensitive_values_in_text_layer
+
+
+def make_pdf(*lines, fontsize=11, line_spacing=20):
+    """Build a one-page PDF with each line of text on its own row"""
+    with fitz.open() as doc:
+        page = doc.new_page()
+        for i, line in enumerate(lines):
+            page.insert_text((72, 72 + line_spacing * i), line, fontsize=fontsize)
+        return doc.tobytes()
+
+
+def found_values(pdf_bytes, values):
+    redactions, _ = find_sensitive_values_in_text_layer(pdf_bytes, values)
+    return [redaction['rect'] for redaction in redactions]
+
+
+def test_exact_word_is_found():
+    pdf_bytes = make_pdf("TFN: 123456789")
+    assert len(found_values(pdf_bytes, ['123456789'])) == 1
+
+
+def test_superstring_is_not_redacted():
+    pdf_bytes = make_pdf("Reference 1234567890")
+    assert found_values(pdf_bytes, ['123456789']) == []
+
+
+def test_prefixed_word_is_not_redacted():
+    pdf_bytes = make_pdf("Invoice A123456789")
+    assert found_values(pdf_bytes, ['123456789']) == []
+
+
+def test_only_the_exact_occurrence_is_redacted():
+    pdf_bytes = make_pdf("TFN: 123456789", "Reference 1234567890")
+    rects = found_values(pdf_bytes, ['123456789'])
+    assert len(rects) == 1
+    # The hit is on the first row, not inside the reference number
+    assert rects[0][1] < 72
+
+
+def test_match_is_case_sensitive():
+    pdf_bytes = make_pdf("Code ABC123")
+    assert found_values(pdf_bytes, ['abc123']) == []
+    assert len(found_values(pdf_bytes, ['ABC123'])) == 1
+
+
+def test_multi_word_value_is_found():
+    pdf_bytes = make_pdf("TFN: 123 456 789")
+    assert len(found_values(pdf_bytes, ['123 456 789'])) == 1
+
+
+def test_match_between_tightly_spaced_lines():
+    # Typical body text: 11pt with 1.2x line spacing, longer words above and below
+    pdf_bytes = make_pdf(
+        "Applicant details provided below",
+        "TFN: 123456789 supplied",
+        "Reference 1234567890 attached",
+        line_spacing=13.2
+    )
+    rects = found_values(pdf_bytes, ['123456789'])
+    assert len(rects) == 1
+    assert 72 < rects[0][3] < 72 + 2 * 13.2
+
+
+def test_value_wrapped_across_lines_is_found():
+    pdf_bytes = make_pdf("Tax file number 123 456", "789 on record", line_spacing=13.2)
+    assert len(found_values(pdf_bytes, ['123 456 789'])) == 2
+
+
+def test_values_missing_from_the_text_layer_are_left_for_azure():
+    # A scanned form with only a typed header: the TFN is in the image, not the text layer
+    _, unmatched = find_sensitive_values_in_text_layer(make_pdf("Tax file number declaration"), ['123456789'])
+    assert unmatched == {0: ['123456789']}
+
+    _, unmatched = find_sensitive_values_in_text_layer(make_pdf(), ['123456789'])
+    assert unmatched == {0: ['123456789']}
+
+    _, unmatched = find_sensitive_values_in_text_layer(make_pdf("TFN: 123456789"), ['123456789', '987654321'])
+    assert unmatched == {0: ['987654321']}